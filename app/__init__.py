@@ -6,12 +6,17 @@ from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
+from flask_caching import Cache
+from flask_compress import Compress
+from app.json_provider import ORJSONProvider
 from config import Config
 
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
 csrf = CSRFProtect()
+cache = Cache()
+compress = Compress()
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"],
@@ -22,11 +27,14 @@ db_manager = None
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = ORJSONProvider(app)
 
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
+    cache.init_app(app)
+    compress.init_app(app)
     limiter.init_app(app)
     login_manager.login_view = 'auth.login'
 
@@ -134,14 +142,8 @@ def create_app(config_class=Config):
         """Inject dashboard preferences into template context for all pages"""
         try:
             if current_user.is_authenticated and current_user.id:
-                from app.models import DashboardPreferences
-                prefs = DashboardPreferences.query.filter_by(user_id=current_user.id).first()
-                if not prefs:
-                    # Create default preferences if they don't exist
-                    prefs = DashboardPreferences(user_id=current_user.id)
-                    db.session.add(prefs)
-                    db.session.commit()
-                return {'prefs': prefs}
+                from app.services.dashboard import get_dashboard_prefs
+                return {'prefs': get_dashboard_prefs(current_user.id)}
         except Exception as e:
             db.session.rollback()
             import logging
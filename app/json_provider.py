@@ -0,0 +1,45 @@
+"""orjson-backed JSON provider for Flask"""
+import json
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import JSONProvider
+
+
+def _default(obj):
+    """Serialize the few types orjson doesn't handle natively"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class ORJSONProvider(JSONProvider):
+    """Use orjson for jsonify(), request.get_json() and the tojson filter.
+
+    orjson encodes datetimes natively (ISO 8601; naive values are treated as
+    UTC), so views don't need to call isoformat() themselves.
+    """
+
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        option = self.option
+        if kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option).decode()
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of decoding
+        # them to str in dumps() and re-encoding
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=self.option), mimetype='application/json'
+        )
+
+    def loads(self, s, **kwargs):
+        # The session serializer passes object_hook, which orjson doesn't support
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
@@ -1,5 +1,6 @@
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy.dialects.postgresql import JSONB
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 
@@ -45,34 +46,48 @@ class Account(db.Model):
     def __repr__(self):
         return f'<Account {self.name}>'
 
+    def balance_effect(self, transaction_type, amount):
+        """Signed change one transaction makes to this account's balance"""
+        if self.account_type == 'credit_card':
+            # For credit cards, balance represents debt (positive = money owed)
+            # Charges (withdrawals) increase debt, payments (deposits) decrease debt
+            if transaction_type == 'withdrawal':
+                return amount
+            elif transaction_type == 'deposit':
+                return -amount
+        else:
+            # For checking, savings, cash accounts: standard logic
+            # Deposits increase balance, withdrawals decrease balance
+            if transaction_type == 'deposit':
+                return amount
+            elif transaction_type == 'withdrawal' or transaction_type == 'transfer':
+                return -amount
+        return 0
+
     def update_balance(self):
         """Calculate current balance based on starting balance and all transactions"""
         total = self.starting_balance
 
         for transaction in self.transactions:
-            if self.account_type == 'credit_card':
-                # For credit cards, balance represents debt (positive = money owed)
-                # Charges (withdrawals) increase debt, payments (deposits) decrease debt
-                if transaction.transaction_type == 'withdrawal':
-                    # Charge/purchase increases debt
-                    total += transaction.amount
-                elif transaction.transaction_type == 'deposit':
-                    # Payment decreases debt
-                    total -= transaction.amount
-            else:
-                # For checking, savings, cash accounts: standard logic
-                # Deposits increase balance, withdrawals decrease balance
-                if transaction.transaction_type == 'deposit':
-                    total += transaction.amount
-                elif transaction.transaction_type == 'withdrawal' or transaction.transaction_type == 'transfer':
-                    total -= transaction.amount
+            total += self.balance_effect(transaction.transaction_type, transaction.amount)
 
         self.current_balance = total
         return self.current_balance
 
+    def apply_balance_delta(self, delta):
+        """Shift current_balance by delta in one UPDATE, without reading the transactions"""
+        db.session.execute(
+            db.update(Account).where(Account.id == self.id)
+            .values(current_balance=Account.current_balance + delta)
+        )
+
 
 class Category(db.Model):
     __tablename__ = 'categories'
+    __table_args__ = (
+        # Duplicate-name checks when creating, renaming and restoring categories
+        db.Index('ix_category_user_name', 'user_id', 'name'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -83,8 +98,10 @@ class Category(db.Model):
 
     # Relationships
     user = db.relationship('User', backref='categories')
-    # Self-referential relationship for subcategories
-    subcategories = db.relationship('Category', backref=db.backref('parent', remote_side=[id]))
+    # Self-referential relationship for subcategories; the category lists
+    # always render them, so load each level with a single IN query
+    parent = db.relationship('Category', remote_side=[id], back_populates='subcategories')
+    subcategories = db.relationship('Category', back_populates='parent', lazy='selectin')
 
     # Relationships
     transactions = db.relationship('Transaction', backref='category', lazy='dynamic')
@@ -95,6 +112,13 @@ class Category(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Transaction lists page through a user's history newest first
+        db.Index('ix_transaction_user_date', 'user_id', db.desc('date'), db.desc('id')),
+        # Account and category filters, plus their transaction collections
+        db.Index('ix_transaction_account_date', 'account_id', db.desc('date')),
+        db.Index('ix_transaction_category_date', 'category_id', db.desc('date')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -120,9 +144,38 @@ class Transaction(db.Model):
     def __repr__(self):
         return f'<Transaction {self.payee} - ${self.amount}>'
 
+    @staticmethod
+    def apply_receipt_data(patches):
+        """Fill placeholder fields from parsed receipt data in one executemany UPDATE
+
+        patches is a list of (transaction_id, parsed_data) pairs. Like the upload
+        form's auto-update, a parsed amount only replaces a zero amount and a
+        parsed merchant only replaces an 'Unknown' payee; the conditions are
+        evaluated in SQL so the rows need not be loaded first.
+        """
+        amount = db.bindparam('parsed_amount', type_=db.Float)
+        merchant = db.bindparam('parsed_merchant', type_=db.String)
+        table = Transaction.__table__
+        stmt = db.update(table).where(table.c.id == db.bindparam('transaction_id')).values(
+            amount=db.case((db.and_(amount.is_not(None), table.c.amount == 0), amount), else_=table.c.amount),
+            payee=db.case((db.and_(merchant.is_not(None), table.c.payee == 'Unknown'), merchant), else_=table.c.payee)
+        )
+        db.session.execute(stmt, [
+            {
+                'transaction_id': transaction_id,
+                'parsed_amount': parsed_data.get('amount') or None,
+                'parsed_merchant': parsed_data.get('merchant') or None
+            }
+            for transaction_id, parsed_data in patches
+        ])
+
 
 class Receipt(db.Model):
     __tablename__ = 'receipts'
+    __table_args__ = (
+        # Recent receipts per user, newest first
+        db.Index('ix_receipt_user_uploaded', 'user_id', db.desc('uploaded_at')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -146,6 +199,13 @@ class Receipt(db.Model):
 
 class TaxTag(db.Model):
     __tablename__ = 'tax_tags'
+    __table_args__ = (
+        # Tags are always listed per tax year: filtered by type, or newest first
+        db.Index('ix_tax_tag_year_type', 'tax_year', 'deduction_type'),
+        db.Index('ix_tax_tag_year_created', 'tax_year', db.desc('created_at')),
+        # add_tax_tag looks up an existing tag for the transaction and year
+        db.Index('ix_tax_tag_transaction_year', 'transaction_id', 'tax_year'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -218,8 +278,8 @@ class Scenario(db.Model):
     scenario_type = db.Column(db.String(50), nullable=False)  # income_change, expense_change, debt_payoff, savings_goal
     base_month = db.Column(db.Date, nullable=False)  # Starting point for forecast
     duration_months = db.Column(db.Integer, nullable=False)  # How many months to forecast
-    parameters = db.Column(db.Text, nullable=False)  # JSON string of scenario parameters
-    results = db.Column(db.Text, nullable=True)  # JSON string of calculated results
+    parameters = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'), nullable=False)  # Scenario parameters
+    results = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'), nullable=True)  # Calculated results
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -232,6 +292,10 @@ class Scenario(db.Model):
 
 class Investment(db.Model):
     __tablename__ = 'investments'
+    __table_args__ = (
+        # Serves per-user lookups by category, e.g. the in-use check on category delete
+        db.Index('ix_investment_user_category', 'user_id', 'category_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -242,16 +306,18 @@ class Investment(db.Model):
     quantity = db.Column(db.Float, nullable=False, default=0)
     purchase_price = db.Column(db.Float, nullable=False, default=0)
     current_price = db.Column(db.Float, nullable=True)
-    current_value = db.Column(db.Float, nullable=True)  # Current price * quantity
+    # Generated by the database so it can never drift from price and quantity
+    current_value = db.Column(db.Float, db.Computed('current_price * quantity', persisted=True), nullable=True)
     purchase_date = db.Column(db.Date, nullable=True)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=True)
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set by the database on insert and on every UPDATE
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
     # Relationships
     user = db.relationship('User', backref='investments')
-    category = db.relationship('InvestmentCategory', backref='investments')
+    category = db.relationship('InvestmentCategory', back_populates='investments')
     account = db.relationship('Account', backref='investments')
 
     def __repr__(self):
@@ -275,6 +341,9 @@ class Investment(db.Model):
 
 class InvestmentCategory(db.Model):
     __tablename__ = 'investment_categories'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'name', name='uq_investment_category_user_name'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -283,8 +352,10 @@ class InvestmentCategory(db.Model):
     color = db.Column(db.String(7), default='#0066cc')  # Hex color for display
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    # Relationship
+    # Relationships
     user = db.relationship('User', backref='investment_categories')
+    # Rendered with every category on the categories page
+    investments = db.relationship('Investment', back_populates='category', lazy='selectin')
 
 
 class Asset(db.Model):
@@ -324,7 +395,7 @@ class DashboardPreferences(db.Model):
     __tablename__ = 'dashboard_preferences'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, unique=True)
     show_accounts = db.Column(db.Boolean, default=True)
     show_transactions = db.Column(db.Boolean, default=True)
     show_investments = db.Column(db.Boolean, default=False)
@@ -341,6 +412,9 @@ class DashboardPreferences(db.Model):
 class PayeeCategory(db.Model):
     """Cache of payee → category mappings for smart categorization"""
     __tablename__ = 'payee_categories'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'payee', name='uq_payee_category_user_payee'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app.models import Account, Transaction
 from app import db, limiter
+from app.services.dashboard import invalidate_net_worth
 
 bp = Blueprint('accounts', __name__, url_prefix='/accounts')
 
@@ -52,6 +53,7 @@ def new_account():
         try:
             db.session.add(account)
             db.session.commit()
+            invalidate_net_worth(current_user.id)
             current_app.logger.debug(f"Account '{name}' created with ID: {account.id}")
 
             flash(f'Account "{name}" created successfully!', 'success')
@@ -88,6 +90,7 @@ def edit_account(id):
             account.update_balance()
 
         db.session.commit()
+        invalidate_net_worth(current_user.id)
 
         flash(f'Account "{account.name}" updated successfully!', 'success')
         return redirect(url_for('accounts.list_accounts'))
@@ -102,6 +105,7 @@ def delete_account(id):
     account = Account.query.filter_by(id=id, user_id=current_user.id).first_or_404()
     account.is_active = False  # Soft delete
     db.session.commit()
+    invalidate_net_worth(current_user.id)
 
     flash(f'Account "{account.name}" deleted successfully!', 'success')
     return redirect(url_for('accounts.list_accounts'))
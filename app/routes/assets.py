@@ -2,7 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app.models import Asset
 from app import db
-from datetime import datetime
+from app.utils import parse_ymd
 
 bp = Blueprint('assets', __name__, url_prefix='/assets')
 
@@ -70,7 +70,7 @@ def new_asset():
         # Convert date string to date object
         if purchase_date:
             try:
-                purchase_date = datetime.strptime(purchase_date, '%Y-%m-%d').date()
+                purchase_date = parse_ymd(purchase_date)
             except (ValueError, TypeError):
                 errors.append('Purchase date must be in YYYY-MM-DD format')
                 purchase_date = None
@@ -145,7 +145,7 @@ def edit_asset(id):
         # Convert date string to date object
         if purchase_date:
             try:
-                purchase_date = datetime.strptime(purchase_date, '%Y-%m-%d').date()
+                purchase_date = parse_ymd(purchase_date)
             except (ValueError, TypeError):
                 errors.append('Purchase date must be in YYYY-MM-DD format')
                 purchase_date = None
@@ -88,12 +88,12 @@ def register():
         try:
             user = User(username=username, email=email)
             user.set_password(password)
+            # Flush for the user id; initialize_user_data commits the user and
+            # their default data together, or rolls both back on failure
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()
 
             if not current_app.db_manager.initialize_user_data(user.id):
-                db.session.delete(user)
-                db.session.commit()
                 flash('Error creating user database. Please try again.', 'danger')
                 return render_template('auth/register.html')
 
@@ -1,6 +1,8 @@
 from flask import Blueprint, send_file, request, redirect, url_for, flash
+from flask_login import current_user
 from app.models import Account, Transaction, Category
 from app import db
+from app.services.dashboard import invalidate_net_worth
 import json
 import os
 from datetime import datetime
@@ -138,6 +140,7 @@ def import_data():
             db.session.add(trans)
 
         db.session.commit()
+        invalidate_net_worth(current_user.id)
 
         flash(f'Data imported successfully! Imported {len(data.get("accounts", []))} accounts, '
               f'{len(data.get("transactions", []))} transactions', 'success')
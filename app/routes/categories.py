@@ -64,8 +64,8 @@ def delete_category(id):
     """Delete category"""
     category = Category.query.filter_by(id=id, user_id=current_user.id).first_or_404()
 
-    # Check if category has transactions
-    if category.transactions.count() > 0:
+    # Check if category has transactions; EXISTS stops at the first one
+    if db.session.query(category.transactions.exists()).scalar():
         flash(f'Cannot delete category "{category.name}" - it has associated transactions', 'danger')
         return redirect(url_for('categories.list_categories'))
 
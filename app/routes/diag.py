@@ -15,6 +15,6 @@ def show_regex_patterns():
             'pattern': p.pattern,
             'account_type': p.account_type,
             'confidence_score': p.confidence_score,
-            'created_at': p.created_at.isoformat()
+            'created_at': p.created_at
         })
     return jsonify(patterns_data)
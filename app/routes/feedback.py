@@ -71,12 +71,7 @@ def list_feedback():
 @login_required
 def view_feedback(feedback_id):
     """View feedback details"""
-    feedback = Feedback.query.get_or_404(feedback_id)
-
-    # Ensure user can only view their own feedback
-    if feedback.user_id != current_user.id:
-        flash('You do not have permission to view this feedback', 'error')
-        return redirect(url_for('feedback.list_feedback'))
+    feedback = Feedback.query.filter_by(id=feedback_id, user_id=current_user.id).first_or_404()
 
     return render_template('feedback/view.html', feedback=feedback)
 
@@ -85,12 +80,7 @@ def view_feedback(feedback_id):
 @login_required
 def edit_feedback(feedback_id):
     """Edit feedback"""
-    feedback = Feedback.query.get_or_404(feedback_id)
-
-    # Ensure user can only edit their own feedback
-    if feedback.user_id != current_user.id:
-        flash('You do not have permission to edit this feedback', 'error')
-        return redirect(url_for('feedback.list_feedback'))
+    feedback = Feedback.query.filter_by(id=feedback_id, user_id=current_user.id).first_or_404()
 
     if request.method == 'POST':
         feedback.feedback_type = request.form.get('feedback_type', feedback.feedback_type)
@@ -113,12 +103,7 @@ def edit_feedback(feedback_id):
 @login_required
 def delete_feedback(feedback_id):
     """Delete feedback"""
-    feedback = Feedback.query.get_or_404(feedback_id)
-
-    # Ensure user can only delete their own feedback
-    if feedback.user_id != current_user.id:
-        flash('You do not have permission to delete this feedback', 'error')
-        return redirect(url_for('feedback.list_feedback'))
+    feedback = Feedback.query.filter_by(id=feedback_id, user_id=current_user.id).first_or_404()
 
     db.session.delete(feedback)
     db.session.commit()
@@ -1,11 +1,14 @@
 """Routes for Financial Health Advisor"""
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from flask_login import current_user
+from flask_login import current_user, login_required
 from datetime import datetime, timedelta
+from sqlalchemy import select, func
 from app import db
+from app.utils import parse_ymd_datetime
 from app.models import FinancialInsight, Transaction, Account
 from app.services.financial_advisor import (
     generate_all_insights,
+    insights_are_fresh,
     detect_spending_spikes,
     identify_subscription_creep,
     calculate_savings_rate,
@@ -15,27 +18,67 @@ from app.services.financial_advisor import (
 
 bp = Blueprint('financial_advisor', __name__, url_prefix='/financial-advisor')
 
+# Upper bound on the number of insights rendered on the advisor dashboard
+DASHBOARD_INSIGHTS_LIMIT = 50
+
+def _active_insight_filters(user_id, since):
+    """Filter criteria for a user's recent, non-dismissed insights"""
+    return (
+        FinancialInsight.user_id == user_id,
+        FinancialInsight.created_at >= since,
+        FinancialInsight.is_dismissed == False
+    )
+
+def _severity_summary(filters):
+    """Count insights and total their impact per severity in one GROUP BY query"""
+    rows = db.session.execute(
+        select(
+            FinancialInsight.severity,
+            func.count(),
+            func.sum(FinancialInsight.amount_impact)
+        ).where(*filters).group_by(FinancialInsight.severity)
+    ).all()
+
+    counts = {severity: count for severity, count, _ in rows}
+    total_impact = sum(impact or 0 for _, _, impact in rows)
+    return counts, total_impact
+
 @bp.route('/')
+@login_required
 def index():
     """Financial advisor dashboard"""
+    # Read the clock once so the date range and the saved-insights cutoff agree
+    now = datetime.now()
+
     # Get date range from query params
-    end_date = datetime.now()
+    end_date = now
     start_date = end_date - timedelta(days=90)  # Last 90 days by default
 
+    explicit_range = bool(request.args.get('start_date') or request.args.get('end_date'))
     if request.args.get('start_date'):
-        start_date = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
+        start_date = parse_ymd_datetime(request.args.get('start_date'))
     if request.args.get('end_date'):
-        end_date = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
-
-    # Generate fresh insights
-    insights = generate_all_insights(start_date, end_date, user_id=current_user.id)
-
-    # Get existing insights from database (last 30 days, not dismissed)
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    saved_insights = FinancialInsight.query.filter(
-        FinancialInsight.created_at >= thirty_days_ago,
-        FinancialInsight.is_dismissed == False
-    ).order_by(FinancialInsight.created_at.desc()).all()
+        end_date = parse_ymd_datetime(request.args.get('end_date'))
+
+    # Default page views only regenerate insights once the saved ones are
+    # stale; saved insights don't record their range, so a requested range and
+    # "Run Analysis" (analyze) always regenerate
+    if explicit_range or not insights_are_fresh(current_user.id):
+        generate_all_insights(start_date, end_date, user_id=current_user.id)
+
+    # Saved insights (last 30 days, not dismissed) and the account total are
+    # built as Core statements and run back-to-back on the same connection
+    thirty_days_ago = now - timedelta(days=30)
+    filters = _active_insight_filters(current_user.id, thirty_days_ago)
+    insights_stmt = select(FinancialInsight).where(*filters)\
+        .order_by(FinancialInsight.created_at.desc())\
+        .limit(DASHBOARD_INSIGHTS_LIMIT)
+    accounts_sum_stmt = select(
+        func.coalesce(func.sum(Account.current_balance), 0)
+    ).where(Account.user_id == current_user.id)
+
+    saved_insights = db.session.execute(insights_stmt).scalars().all()
+    total_balance = db.session.execute(accounts_sum_stmt).scalar()
 
     # Group insights by type
     insights_by_type = {
@@ -44,15 +87,12 @@ def index():
         'info': [i for i in saved_insights if i.severity == 'info']
     }
 
-    # Calculate statistics
-    total_insights = len(saved_insights)
-    critical_count = len(insights_by_type['critical'])
-    warning_count = len(insights_by_type['warning'])
-    info_count = len(insights_by_type['info'])
-
-    # Get account summary
-    accounts = Account.query.all()
-    total_balance = sum(acc.current_balance for acc in accounts)
+    # Counters come from the database so they stay correct past the display limit
+    counts, _ = _severity_summary(filters)
+    total_insights = sum(counts.values())
+    critical_count = counts.get('critical', 0)
+    warning_count = counts.get('warning', 0)
+    info_count = counts.get('info', 0)
 
     return render_template('financial_advisor/index.html',
                          insights_by_type=insights_by_type,
@@ -65,14 +105,15 @@ def index():
                          end_date=end_date)
 
 @bp.route('/analyze', methods=['POST'])
+@login_required
 def analyze():
     """Run fresh analysis"""
     start_date_str = request.form.get('start_date')
     end_date_str = request.form.get('end_date')
 
     if start_date_str and end_date_str:
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+        start_date = parse_ymd_datetime(start_date_str)
+        end_date = parse_ymd_datetime(end_date_str)
     else:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=90)
@@ -84,6 +125,7 @@ def analyze():
     return redirect(url_for('financial_advisor.index'))
 
 @bp.route('/insight/<int:insight_id>/dismiss', methods=['POST'])
+@login_required
 def dismiss_insight(insight_id):
     """Dismiss an insight"""
     insight = FinancialInsight.query.get_or_404(insight_id)
@@ -94,6 +136,7 @@ def dismiss_insight(insight_id):
     return redirect(url_for('financial_advisor.index'))
 
 @bp.route('/insights/history')
+@login_required
 def insights_history():
     """View all insights including dismissed ones"""
     # Get filter parameters
@@ -129,6 +172,7 @@ def insights_history():
                          show_dismissed=show_dismissed)
 
 @bp.route('/spending-analysis')
+@login_required
 def spending_analysis():
     """Detailed spending analysis"""
     # Get date range
@@ -136,9 +180,9 @@ def spending_analysis():
     start_date = end_date - timedelta(days=90)
 
     if request.args.get('start_date'):
-        start_date = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
+        start_date = parse_ymd_datetime(request.args.get('start_date'))
     if request.args.get('end_date'):
-        end_date = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
+        end_date = parse_ymd_datetime(request.args.get('end_date'))
 
     # Run analyses
     spikes = detect_spending_spikes(start_date, end_date)
@@ -157,18 +201,16 @@ def spending_analysis():
                          end_date=end_date)
 
 @bp.route('/api/insights/summary')
+@login_required
 def api_insights_summary():
     """API endpoint for insights summary"""
     thirty_days_ago = datetime.now() - timedelta(days=30)
-    insights = FinancialInsight.query.filter(
-        FinancialInsight.created_at >= thirty_days_ago,
-        FinancialInsight.is_dismissed == False
-    ).all()
+    counts, total_impact = _severity_summary(_active_insight_filters(current_user.id, thirty_days_ago))
 
     return jsonify({
-        'total': len(insights),
-        'critical': len([i for i in insights if i.severity == 'critical']),
-        'warning': len([i for i in insights if i.severity == 'warning']),
-        'info': len([i for i in insights if i.severity == 'info']),
-        'total_impact': sum(i.amount_impact for i in insights if i.amount_impact)
+        'total': sum(counts.values()),
+        'critical': counts.get('critical', 0),
+        'warning': counts.get('warning', 0),
+        'info': counts.get('info', 0),
+        'total_impact': total_impact
     })
@@ -2,26 +2,54 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app.models import Investment, InvestmentCategory, Account
 from app import db
-from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only, selectinload
+from app.utils import parse_ymd
 
 bp = Blueprint('investments', __name__, url_prefix='/investments')
 
+# Holdings shown per page on the investments dashboard
+INVESTMENTS_PER_PAGE = 50
+
 @bp.route('/')
 @login_required
 def index():
     """Investments dashboard"""
-    investments = Investment.query.filter_by(user_id=current_user.id).all()
-    categories = InvestmentCategory.query.filter_by(user_id=current_user.id).all()
-
-    # Calculate portfolio totals
-    total_invested = sum(inv.purchase_price * inv.quantity for inv in investments if inv.purchase_price and inv.quantity)
-    total_current_value = sum(inv.current_value for inv in investments if inv.current_value)
+    # Keyset pagination: each page holds the investments with ids below ?cursor=
+    cursor = request.args.get('cursor', type=int)
+
+    # The table shows each investment's category; load them all in one IN query.
+    # Only the columns the table renders are fetched (notes etc. are skipped)
+    query = Investment.query.options(
+        load_only(Investment.name, Investment.ticker, Investment.investment_type,
+                  Investment.category_id, Investment.quantity, Investment.purchase_price,
+                  Investment.current_price, Investment.current_value),
+        selectinload(Investment.category)
+    ).filter_by(user_id=current_user.id)
+    if cursor:
+        query = query.filter(Investment.id < cursor)
+    # Fetch one extra row to know whether there is a next page
+    investments = query.order_by(Investment.id.desc()).limit(INVESTMENTS_PER_PAGE + 1).all()
+    next_cursor = None
+    if len(investments) > INVESTMENTS_PER_PAGE:
+        investments = investments[:INVESTMENTS_PER_PAGE]
+        next_cursor = investments[-1].id
+
+    # Portfolio totals cover every holding, not just this page, in a single aggregate query
+    total_invested, total_current_value, total_holdings = db.session.query(
+        func.coalesce(func.sum(Investment.purchase_price * Investment.quantity), 0),
+        func.coalesce(func.sum(Investment.current_value), 0),
+        func.count(Investment.id)
+    ).filter_by(user_id=current_user.id).one()
     total_gain_loss = total_current_value - total_invested if total_current_value else 0
 
     try:
         return render_template('investments/index.html',
                              investments=investments,
-                             categories=categories,
+                             cursor=cursor,
+                             next_cursor=next_cursor,
+                             total_holdings=total_holdings,
                              total_invested=total_invested,
                              total_current_value=total_current_value,
                              total_gain_loss=total_gain_loss)
@@ -30,55 +58,47 @@ def index():
         flash('An error occurred while loading the investments dashboard.', 'danger')
         return redirect(url_for('main.index'))
 
+def _parse_investment_form(form):
+    """Read and coerce the investment form in one pass
+
+    Returns the Investment column values; raises ValueError or TypeError on
+    malformed numbers or dates.
+    """
+    current_price = form.get('current_price')
+    purchase_date = form.get('purchase_date')
+    return {
+        'name': form.get('name'),
+        'ticker': form.get('ticker'),
+        'investment_type': form.get('investment_type'),
+        'category_id': form.get('category_id') or None,
+        'quantity': float(form.get('quantity', 0)),
+        'purchase_price': float(form.get('purchase_price', 0)),
+        'current_price': float(current_price) if current_price else None,
+        'purchase_date': parse_ymd(purchase_date) if purchase_date else None,
+        'account_id': form.get('account_id') or None,
+        'notes': form.get('notes'),
+    }
+
+def _load_form_context(user_id):
+    """Category and account choices for the investment form; only needed when rendering it"""
+    return {
+        'categories': InvestmentCategory.query.filter_by(user_id=user_id).all(),
+        'accounts': Account.query.filter_by(user_id=user_id, is_active=True).all(),
+    }
+
 @bp.route('/new', methods=['GET', 'POST'])
 @login_required
 def new_investment():
     """Create new investment"""
-    categories = InvestmentCategory.query.filter_by(user_id=current_user.id).all()
-    accounts = Account.query.filter_by(user_id=current_user.id, is_active=True).all()
-
     if request.method == 'POST':
-        name = request.form.get('name')
-        ticker = request.form.get('ticker')
-        investment_type = request.form.get('investment_type')
-        category_id = request.form.get('category_id') or None
-
         try:
-            quantity = float(request.form.get('quantity', 0))
-            purchase_price = float(request.form.get('purchase_price', 0))
-            current_price = request.form.get('current_price')
-            current_price = float(current_price) if current_price else None
+            fields = _parse_investment_form(request.form.to_dict())
         except (ValueError, TypeError):
-            flash('Invalid quantity, price, or current price values.', 'danger')
+            flash('Invalid quantity, price, current price, or purchase date values.', 'danger')
             return redirect(url_for('investments.new_investment'))
-        purchase_date_str = request.form.get('purchase_date')
-        account_id = request.form.get('account_id') or None
-        notes = request.form.get('notes')
-
-        # Calculate current value
-        current_value = None
-        if current_price:
-            current_value = current_price * quantity
+        name = fields['name']
 
-        # Parse purchase date
-        purchase_date = None
-        if purchase_date_str:
-            purchase_date = datetime.strptime(purchase_date_str, '%Y-%m-%d').date()
-
-        investment = Investment(
-            user_id=current_user.id,
-            name=name,
-            ticker=ticker,
-            investment_type=investment_type,
-            category_id=category_id if category_id else None,
-            quantity=quantity,
-            purchase_price=purchase_price,
-            current_price=current_price,
-            current_value=current_value,
-            purchase_date=purchase_date,
-            account_id=account_id if account_id else None,
-            notes=notes
-        )
+        investment = Investment(user_id=current_user.id, **fields)
 
         db.session.add(investment)
         db.session.commit()
@@ -87,51 +107,33 @@ def new_investment():
         flash(f'Investment "{name}" created successfully!', 'success')
         return redirect(url_for('investments.index'))
 
-    return render_template('investments/form.html', investment=None, categories=categories, accounts=accounts)
+    return render_template('investments/form.html', investment=None, **_load_form_context(current_user.id))
 
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_investment(id):
     """Edit investment"""
     investment = Investment.query.filter_by(id=id, user_id=current_user.id).first_or_404()
-    categories = InvestmentCategory.query.filter_by(user_id=current_user.id).all()
-    accounts = Account.query.filter_by(user_id=current_user.id, is_active=True).all()
 
     if request.method == 'POST':
         try:
-            quantity = float(request.form.get('quantity', 0))
-            purchase_price = float(request.form.get('purchase_price', 0))
-            current_price = request.form.get('current_price')
-            current_price = float(current_price) if current_price else None
+            fields = _parse_investment_form(request.form.to_dict())
         except (ValueError, TypeError):
-            flash('Invalid quantity, price, or current price values.', 'danger')
+            flash('Invalid quantity, price, current price, or purchase date values.', 'danger')
             return redirect(url_for('investments.edit_investment', id=id))
 
-        investment.name = request.form.get('name')
-        investment.ticker = request.form.get('ticker')
-        investment.investment_type = request.form.get('investment_type')
-        investment.category_id = request.form.get('category_id') or None
-        investment.quantity = quantity
-        investment.purchase_price = purchase_price
-        investment.current_price = current_price
-
-        if investment.current_price:
-            investment.current_value = investment.current_price * investment.quantity
-
-        purchase_date_str = request.form.get('purchase_date')
-        if purchase_date_str:
-            investment.purchase_date = datetime.strptime(purchase_date_str, '%Y-%m-%d').date()
-
-        investment.account_id = request.form.get('account_id') or None
-        investment.notes = request.form.get('notes')
-        investment.updated_at = datetime.utcnow()
+        # A blank purchase date keeps the one already stored
+        if fields['purchase_date'] is None:
+            del fields['purchase_date']
+        for field, value in fields.items():
+            setattr(investment, field, value)
 
         db.session.commit()
 
         flash(f'Investment "{investment.name}" updated successfully!', 'success')
         return redirect(url_for('investments.index'))
 
-    return render_template('investments/form.html', investment=investment, categories=categories, accounts=accounts)
+    return render_template('investments/form.html', investment=investment, **_load_form_context(current_user.id))
 
 @bp.route('/<int:id>/delete', methods=['POST'])
 @login_required
@@ -162,12 +164,6 @@ def new_category():
         description = request.form.get('description')
         color = request.form.get('color', '#0066cc')
 
-        # Check if category already exists
-        existing = InvestmentCategory.query.filter_by(name=name, user_id=current_user.id).first()
-        if existing:
-            flash('Category already exists!', 'danger')
-            return redirect(url_for('investments.categories'))
-
         category = InvestmentCategory(
             user_id=current_user.id,
             name=name,
@@ -175,8 +171,14 @@ def new_category():
             color=color
         )
 
+        # The unique (user_id, name) constraint rejects duplicates
         db.session.add(category)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('Category already exists!', 'danger')
+            return redirect(url_for('investments.categories'))
 
         flash(f'Category "{name}" created successfully!', 'success')
         return redirect(url_for('investments.categories'))
@@ -193,7 +195,12 @@ def edit_category(id):
         category.description = request.form.get('description')
         category.color = request.form.get('color')
 
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('Category already exists!', 'danger')
+            return redirect(url_for('investments.edit_category', id=id))
 
         flash(f'Category "{category.name}" updated successfully!', 'success')
         return redirect(url_for('investments.categories'))
@@ -208,9 +215,12 @@ def delete_category(id):
     name = category.name
 
     # Check if category is in use
-    investments_count = Investment.query.filter_by(category_id=id, user_id=current_user.id).count()
-    if investments_count > 0:
-        flash(f'Cannot delete category "{name}" - it has {investments_count} investment(s) assigned to it', 'danger')
+    # EXISTS stops at the first matching row instead of counting them all
+    in_use = db.session.query(
+        Investment.query.filter_by(category_id=id, user_id=current_user.id).exists()
+    ).scalar()
+    if in_use:
+        flash(f'Cannot delete category "{name}" - it has investments assigned to it', 'danger')
         return redirect(url_for('investments.categories'))
 
     db.session.delete(category)
@@ -1,9 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, jsonify, current_app
 from flask_login import login_required, current_user
 from sqlalchemy import text
-from app.models import DashboardPreferences
 from app import db
-from app.services.dashboard import DashboardService
+from app.services.dashboard import DashboardService, get_dashboard_prefs
 
 bp = Blueprint('main', __name__)
 
@@ -19,16 +18,13 @@ def index():
 
 def dashboard():
     """Dashboard view showing account summary and recent transactions"""
-    # Get dashboard data from the service layer
-    service = DashboardService(user_id=current_user.id)
-    dashboard_data = service.get_net_worth_data()
+    # Get (or create) the user's dashboard preferences
+    prefs = get_dashboard_prefs(current_user.id)
 
-    # Get or create dashboard preferences for user
-    prefs = DashboardPreferences.query.filter_by(user_id=current_user.id).first()
-    if not prefs:
-        prefs = DashboardPreferences(user_id=current_user.id)
-        db.session.add(prefs)
-        db.session.commit()
+    # Get dashboard data from the service layer, skipping rows for hidden panels
+    service = DashboardService(user_id=current_user.id)
+    dashboard_data = service.get_cached_net_worth_data(include_accounts=prefs['show_accounts'],
+                                                       include_transactions=prefs['show_transactions'])
 
     return render_template('dashboard.html', **dashboard_data, prefs=prefs)
 
@@ -41,7 +37,14 @@ def health():
     """
     try:
         # Check database connection using SQLAlchemy 2.0 syntax
-        db.session.execute(text('SELECT 1'))
+        health_engine = db.engines.get('health')
+        if health_engine is not None:
+            # Reserved pool with a short statement timeout (see Config.SQLALCHEMY_BINDS)
+            with health_engine.connect() as conn:
+                conn.execute(text("SET LOCAL statement_timeout = '500ms'"))
+                conn.execute(text('SELECT 1'))
+        else:
+            db.session.execute(text('SELECT 1'))
         return jsonify({
             'status': 'healthy',
             'database': 'connected'
@@ -1,27 +1,89 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app, session
 from flask_login import current_user, login_required
-from app.services.receipt_ocr import ReceiptOCRAgent
-from app.services.categorizer import TransactionCategorizer
+from app.services.receipt_ocr import get_ocr_agent
+from app.services.categorizer import TransactionCategorizer, normalize_payee
 from app.models import Receipt, Transaction, Account, Category
-from app import db
+from app import db, cache
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, load_only
+from app.services.dashboard import invalidate_net_worth
+from app.services.scenario_planner import invalidate_historical_averages
 from werkzeug.utils import secure_filename
-from app.routes.settings import get_currency_info, get_current_currency
-import json
-from datetime import datetime
+from app.routes.settings import get_currency_context
+from app.utils import parse_ymd
+import orjson
+import secrets
+import time
 
 bp = Blueprint('receipts', __name__, url_prefix='/receipts')
 
+# Columns the receipts dashboard renders, plus the linked transaction's payee
+RECENT_RECEIPT_COLUMNS = (Receipt.id, Receipt.extracted_merchant, Receipt.extracted_date,
+                          Receipt.extracted_amount, Receipt.uploaded_at, Transaction.payee)
+
+# Browser cache lifetime for receipt images, in seconds (one year)
+RECEIPT_IMAGE_MAX_AGE = 31536000
+
+# How long extracted statement/receipt data waits for the user to confirm, in seconds
+PENDING_DATA_TIMEOUT = 900
+
+
+def _pending_in_cache():
+    """Whether pending payloads can live in the cache
+
+    The confirm request may reach a different gunicorn worker or Cloud Run
+    instance than the one that stored the payload, so only a shared Redis
+    will do; otherwise they are kept in the user's session.
+    """
+    return bool(current_app.config.get('CACHE_REDIS_URL'))
+
+
+def _stash_pending(kind, data):
+    """Park a pending import/receipt payload and return the token that fetches it
+
+    With Redis only the token travels to the client, so large statements stay
+    out of the session cookie.
+    """
+    token = secrets.token_urlsafe(16)
+    if _pending_in_cache():
+        cache.set(f'{kind}:{token}', data, timeout=PENDING_DATA_TIMEOUT)
+    else:
+        session[kind] = {'token': token, 'data': data}
+    return token
+
+
+def _get_pending(kind, token):
+    if not token:
+        return None
+    if _pending_in_cache():
+        return cache.get(f'{kind}:{token}')
+    pending = session.get(kind)
+    return pending['data'] if pending and pending.get('token') == token else None
+
+
+def _clear_pending(kind, token):
+    if _pending_in_cache():
+        cache.delete(f'{kind}:{token}')
+    else:
+        session.pop(kind, None)
+
+def _get_owned_receipt(receipt_id, *options):
+    """Fetch one of the current user's receipts or 404; ownership is part of the query"""
+    return Receipt.query.options(*options).filter_by(id=receipt_id, user_id=current_user.id).first_or_404()
+
 @bp.route('/')
 @login_required
 def index():
     """Receipt management dashboard"""
-    agent = ReceiptOCRAgent()
+    agent = get_ocr_agent()
     stats = agent.get_receipt_stats(current_user.id)
 
-    # Get recent receipts for current user only
-    recent_receipts = Receipt.query.join(Transaction).filter(
-        Transaction.user_id == current_user.id
-    ).order_by(Receipt.uploaded_at.desc()).limit(20).all()
+    # Get recent receipts for current user only (served by ix_receipt_user_uploaded)
+    # as plain rows holding just the rendered columns
+    recent_receipts = db.session.query(*RECENT_RECEIPT_COLUMNS)\
+        .outerjoin(Transaction, Receipt.transaction_id == Transaction.id)\
+        .filter(Receipt.user_id == current_user.id)\
+        .order_by(Receipt.uploaded_at.desc()).limit(20).all()
 
     return render_template('receipts/index.html',
                          stats=stats,
@@ -49,7 +111,7 @@ def upload(transaction_id):
             flash('No file selected', 'danger')
             return redirect(request.url)
 
-        agent = ReceiptOCRAgent()
+        agent = get_ocr_agent()
 
         if not agent.allowed_file(file.filename):
             flash('Invalid file type. Allowed types: PNG, JPG, JPEG, PDF, WEBP', 'danger')
@@ -64,14 +126,9 @@ def upload(transaction_id):
 
         # Optionally update transaction with extracted data
         if request.form.get('auto_update') == 'on':
-            if parsed_data.get('date') and not transaction.date:
-                transaction.date = parsed_data['date']
-            if parsed_data.get('amount') and transaction.amount == 0:
-                transaction.amount = parsed_data['amount']
-            if parsed_data.get('merchant') and transaction.payee == 'Unknown':
-                transaction.payee = parsed_data['merchant']
-
+            Transaction.apply_receipt_data([(transaction.id, parsed_data)])
             db.session.commit()
+            invalidate_net_worth(current_user.id)
 
         flash(f'Receipt uploaded and processed successfully! Found: {len(parsed_data.get("items", []))} items', 'success')
         return redirect(url_for('transactions.list_transactions'))
@@ -90,13 +147,13 @@ def review_statement():
     account_id = import_data.get('account_id')
     transactions = import_data.get('transactions', [])
 
-    # Store in session for bulk import
-    session['pending_import'] = {
+    # Park the payload for bulk import
+    token = _stash_pending('pending_import', {
         'account_id': account_id,
         'transactions': transactions
-    }
+    })
 
-    return jsonify({'success': True, 'count': len(transactions)})
+    return jsonify({'success': True, 'count': len(transactions), 'token': token})
 
 @bp.route('/bulk-import', methods=['POST'])
 @login_required
@@ -104,41 +161,42 @@ def bulk_import():
     """Import multiple transactions from reviewed statement data"""
     try:
         # Try to get data from JSON request body
-        import_data = request.get_json()
+        import_data = request.get_json(silent=True)
         current_app.logger.debug(f"Bulk import request received. Import data present: {import_data is not None}")
 
-        if import_data:
+        import_token = import_data.get('token') if import_data else request.form.get('token')
+        if import_data and not import_token:
             # Data from AJAX request
             account_id = import_data.get('account_id')
             transactions_data = import_data.get('transactions', [])
             current_app.logger.info(f"Processing bulk import with {len(transactions_data)} transactions for account {account_id}")
         else:
-            # Fallback to session data
-            pending_data = session.get('pending_import')
+            # Data parked by review_statement
+            pending_data = _get_pending('pending_import', import_token)
             if not pending_data:
-                current_app.logger.warning('No pending import data in session')
+                current_app.logger.warning('No pending import data for token')
                 return jsonify({'error': 'No pending import data found'}), 400
 
             account_id = pending_data['account_id']
             transactions_data = pending_data['transactions']
-            current_app.logger.info(f"Processing bulk import from session with {len(transactions_data)} transactions for account {account_id}")
+            current_app.logger.info(f"Processing bulk import of pending data with {len(transactions_data)} transactions for account {account_id}")
 
         if not account_id:
             current_app.logger.error('Account ID is missing or empty')
             return jsonify({'error': 'Account ID required'}), 400
 
-        try:
-            account = Account.query.get_or_404(account_id)
-            current_app.logger.info(f"Found account: {account.name} (ID: {account_id})")
-        except Exception as e:
-            current_app.logger.error(f"Error finding account {account_id}: {str(e)}", exc_info=True)
+        # Ownership is part of the query, and the import only needs the
+        # account's type (for the balance delta) besides its id
+        account = Account.query.options(load_only(Account.account_type))\
+            .filter_by(id=account_id, user_id=current_user.id).first()
+        if account is None:
+            current_app.logger.error(f"Account {account_id} not found for user {current_user.id}")
             return jsonify({'error': f'Account not found: {account_id}'}), 404
 
-        # Verify user owns this account
-        if account.user_id != current_user.id:
-            return jsonify({'error': 'Access denied'}), 403
-
-        imported_count = 0
+        # Plain dicts for a single executemany INSERT instead of per-row ORM adds,
+        # plus normalized payee → (category_id, times_seen) for the categorizer cache
+        mappings = []
+        payee_categories = {}
         for trans_data in transactions_data:
             # Validate required fields
             if not trans_data.get('date') or not trans_data.get('amount') or not trans_data.get('description'):
@@ -148,7 +206,7 @@ def bulk_import():
                 # Parse date string if needed
                 trans_date = trans_data['date']
                 if isinstance(trans_date, str):
-                    trans_date = datetime.strptime(trans_date, '%Y-%m-%d').date()
+                    trans_date = parse_ymd(trans_date)
 
                 # Parse amount
                 amount = float(trans_data['amount'])
@@ -173,74 +231,75 @@ def bulk_import():
                 # Store amount as absolute value; transaction_type determines the sign
                 abs_amount = abs(amount)
 
-                # Create transaction
-                transaction = Transaction(
-                    user_id=current_user.id,
-                    account_id=account_id,
-                    date=trans_date,
-                    payee=trans_data.get('description', 'Unknown'),
-                    amount=abs_amount,
-                    category_id=category_id,
-                    transaction_type=trans_type
-                )
-
-                db.session.add(transaction)
-                imported_count += 1
+                mappings.append({
+                    'user_id': current_user.id,
+                    'account_id': account.id,
+                    'date': trans_date,
+                    'payee': trans_data.get('description', 'Unknown'),
+                    'amount': abs_amount,
+                    'category_id': category_id,
+                    'transaction_type': trans_type
+                })
+                if category_id:
+                    payee = normalize_payee(mappings[-1]['payee'])
+                    _, times_seen = payee_categories.get(payee, (None, 0))
+                    payee_categories[payee] = (category_id, times_seen + 1)
             except Exception as e:
                 # Log error but continue with other transactions
                 current_app.logger.warning(f"Error importing transaction from {trans_data.get('description', 'Unknown')}: {str(e)}")
                 continue
 
-        # Update account balance
-        try:
-            current_app.logger.info(f"Imported {imported_count} transactions, updating account balance...")
-            db.session.flush()  # Flush to database so update_balance can see the new transactions
-            account.update_balance()
-            current_app.logger.info(f"Account balance updated. New balance: {account.current_balance}")
-        except Exception as e:
-            current_app.logger.error(f"Error updating account balance: {str(e)}", exc_info=True)
-            db.session.rollback()
-            raise
-
-        try:
-            db.session.commit()
-            current_app.logger.info(f"Successfully committed {imported_count} transactions")
-        except Exception as e:
-            current_app.logger.error(f"Error committing transactions: {str(e)}", exc_info=True)
-            db.session.rollback()
-            raise
-
-        # Create receipt record if we have pending receipt data (from session or request)
-        receipt_data = None
-        if 'pending_receipt' in session:
-            receipt_data = session.get('pending_receipt')
-        elif import_data and 'receipt_metadata' in import_data:
+        # Insert the rows as executemany batches within one transaction; the
+        # returned ids (in input order) identify the imported transactions
+        # without a follow-up query
+        imported_ids = []
+        batch_size = current_app.config['BULK_IMPORT_BATCH_SIZE']
+        for start in range(0, len(mappings), batch_size):
+            batch = mappings[start:start + batch_size]
+            started = time.perf_counter()
+            imported_ids.extend(db.session.execute(
+                insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+                batch
+            ).scalars())
+            current_app.logger.info(f"{len(batch)} transactions inserted in {time.perf_counter() - started:.3f} seconds")
+        imported_count = len(imported_ids)
+
+        # Everything below lands in a single commit at the end. The balance moves
+        # by the sum of the imported amounts rather than re-reading every
+        # transaction on the account.
+        account.apply_balance_delta(sum(
+            account.balance_effect(m['transaction_type'], m['amount']) for m in mappings
+        ))
+        current_app.logger.info(f"Imported {imported_count} transactions, account balance adjusted")
+
+        # Create receipt record if we have pending receipt data (from cache or request)
+        receipt_token = import_data.get('receipt_token') if import_data else request.form.get('receipt_token')
+        receipt_data = _get_pending('pending_receipt', receipt_token)
+        if receipt_data is None and import_data and 'receipt_metadata' in import_data:
             receipt_data = import_data.get('receipt_metadata')
 
         if imported_count > 0 and receipt_data:
             try:
-                agent = ReceiptOCRAgent()
+                agent = get_ocr_agent()
 
                 current_app.logger.info(f"Creating receipt record for {imported_count} imported transactions")
                 current_app.logger.debug(f"Receipt data: {receipt_data}")
 
-                # Get the first imported transaction to link to
+                # Link to the first imported transaction
                 # (In bulk import, all transactions come from the same receipt)
-                first_transaction = Transaction.query.filter_by(
-                    account_id=account_id,
-                    user_id=current_user.id
-                ).order_by(Transaction.id.desc()).first()
+                first_transaction_id = imported_ids[0]
 
-                if first_transaction:
-                    # Create receipt record linking to the first transaction
+                # Create receipt record linking to the first transaction; the
+                # savepoint keeps a failure here from undoing the import
+                with db.session.begin_nested():
                     receipt = agent.create_receipt_record(
                         user_id=current_user.id,
                         filepath=receipt_data.get('filepath'),
                         filename=receipt_data.get('filename'),
-                        transaction_id=first_transaction.id,
+                        transaction_id=first_transaction_id,
                         parsed_data={
                             'merchant': receipt_data.get('merchant', 'Bank Statement'),
-                            'date': first_transaction.date,
+                            'date': mappings[0]['date'],
                             'items': [
                                 {
                                     'description': t.get('description', 'Unknown'),
@@ -250,34 +309,33 @@ def bulk_import():
                                 for t in transactions_data if t.get('description')
                             ]
                         },
-                        file_type=receipt_data.get('file_type')
+                        file_type=receipt_data.get('file_type'),
+                        commit=False
                     )
 
-                    current_app.logger.info(f"✓ Created receipt record ID {receipt.id} for transaction ID {first_transaction.id}")
-
-                    # Clear session data if it exists
-                    session.pop('pending_receipt', None)
-                else:
-                    current_app.logger.warning(f"No transaction found to link receipt to for account {account_id}")
+                current_app.logger.info(f"✓ Created receipt record ID {receipt.id} for transaction ID {first_transaction_id}")
             except Exception as e:
                 current_app.logger.error(f"Failed to create receipt record for bulk import: {str(e)}", exc_info=True)
 
-        # Save category mappings for future use
-        if imported_count > 0:
-            categorizer = TransactionCategorizer(current_user.id)
-            for trans_data in transactions_data:
-                if trans_data.get('category_id') and trans_data.get('description'):
-                    try:
-                        categorizer.update_mapping(
-                            payee=trans_data['description'],
-                            category_id=int(trans_data['category_id'])
-                        )
-                    except Exception as e:
-                        current_app.logger.warning(f"Failed to save category mapping: {str(e)}")
+        # Save category mappings for future use in a single upsert
+        if imported_count > 0 and payee_categories:
+            if not TransactionCategorizer(current_user.id).update_mappings_bulk(payee_categories, commit=False):
+                current_app.logger.warning('Failed to save category mappings')
+
+        try:
+            db.session.commit()
+            invalidate_net_worth(current_user.id)
+            invalidate_historical_averages(current_user.id)
+            current_app.logger.info(f"Successfully committed {imported_count} transactions")
+        except Exception as e:
+            current_app.logger.error(f"Error committing transactions: {str(e)}", exc_info=True)
+            db.session.rollback()
+            raise
 
-        # Clear session data if it exists
-        if 'pending_import' in session:
-            session.pop('pending_import', None)
+        if import_token:
+            _clear_pending('pending_import', import_token)
+        if receipt_token:
+            _clear_pending('pending_receipt', receipt_token)
 
         if import_data:
             # Return JSON for AJAX request
@@ -316,7 +374,7 @@ def upload_new():
             flash('No file selected', 'danger')
             return redirect(request.url)
 
-        agent = ReceiptOCRAgent()
+        agent = get_ocr_agent()
 
         # Extract data without creating database records yet
         filepath, filename, parsed_data, file_type = agent.extract_receipt_data(file, current_user.id, 'temp', password=pdf_password)
@@ -333,12 +391,12 @@ def upload_new():
             flash(f'Error processing receipt: {parsed_data}', 'danger')
             return redirect(request.url)
 
-        # Store file info in session for later receipt creation
-        session['pending_receipt'] = {
+        # Park file info for later receipt creation
+        receipt_token = _stash_pending('pending_receipt', {
             'filepath': filepath,
             'filename': filename,
             'file_type': file_type
-        }
+        })
 
         # Extract statement info and determine extraction method
         statement_info = None
@@ -368,7 +426,7 @@ def upload_new():
         return jsonify({
             'line_items': [
                 {
-                    'date': item['date'].isoformat() if hasattr(item.get('date'), 'isoformat') else str(item.get('date', '')),
+                    'date': item.get('date', ''),
                     'description': item.get('description', 'Unknown'),
                     'amount': item.get('amount', 0.0),
                     '_statement_info': item.get('_statement_info'),
@@ -378,15 +436,18 @@ def upload_new():
             ],
             'statement_info': statement_info,
             'extraction_method': extraction_method,
-            'transaction_count': len(line_items)
+            'transaction_count': len(line_items),
+            'receipt_token': receipt_token
         })
 
-    accounts = Account.query.filter_by(user_id=current_user.id, is_active=True).all()
-    currency_info = get_currency_info()
+    # The account picker only needs id and name
+    accounts = db.session.query(Account.id, Account.name)\
+        .filter_by(user_id=current_user.id, is_active=True).order_by(Account.name).all()
+    currency_symbol, currency_code, _ = get_currency_context()
     return render_template('receipts/upload_new.html',
                          accounts=accounts,
-                         currency_symbol=currency_info['symbol'],
-                         currency_code=get_current_currency())
+                         currency_symbol=currency_symbol,
+                         currency_code=currency_code)
 
 @bp.route('/confirm-receipt', methods=['POST'])
 @login_required
@@ -407,15 +468,16 @@ def confirm_receipt():
         return jsonify({'error': 'Missing required fields'}), 400
 
     try:
-        # Verify user owns the account
-        account = Account.query.get_or_404(account_id)
-        if account.user_id != current_user.id:
-            return jsonify({'error': 'Access denied'}), 403
+        # Ownership is part of the query; only the type is needed for the balance delta
+        account = Account.query.options(load_only(Account.account_type))\
+            .filter_by(id=account_id, user_id=current_user.id).first()
+        if account is None:
+            return jsonify({'error': 'Account not found'}), 404
 
         # Create transaction with reviewed data
         transaction = Transaction(
             user_id=current_user.id,
-            date=datetime.strptime(transaction_date, '%Y-%m-%d').date() if isinstance(transaction_date, str) else transaction_date,
+            date=parse_ymd(transaction_date) if isinstance(transaction_date, str) else transaction_date,
             amount=float(amount),
             payee=merchant,
             transaction_type='withdrawal',
@@ -423,13 +485,17 @@ def confirm_receipt():
             category_id=int(category_id) if category_id else None
         )
 
+        # Flush for the transaction id; everything below is committed together
         db.session.add(transaction)
-        db.session.commit()
+        db.session.flush()
 
         # Create receipt record if we have pending receipt data
-        if 'pending_receipt' in session:
-            agent = ReceiptOCRAgent()
-            receipt_data = session['pending_receipt']
+        receipt_token = data.get('receipt_token')
+        receipt_data = _get_pending('pending_receipt', receipt_token)
+        if receipt_token and not receipt_data:
+            current_app.logger.warning('Pending receipt expired or missing; transaction saved without a receipt')
+        if receipt_data:
+            agent = get_ocr_agent()
 
             # Create receipt record linking to the new transaction
             agent.create_receipt_record(
@@ -438,15 +504,16 @@ def confirm_receipt():
                 filename=receipt_data['filename'],
                 transaction_id=transaction.id,
                 parsed_data={'merchant': merchant, 'date': transaction.date, 'amount': amount},
-                file_type=receipt_data['file_type']
+                file_type=receipt_data['file_type'],
+                commit=False
             )
 
-            # Clear session data
-            session.pop('pending_receipt', None)
-
-        # Update account balance
-        account.update_balance()
+        # Update account balance by the new withdrawal
+        account.apply_balance_delta(account.balance_effect(transaction.transaction_type, transaction.amount))
         db.session.commit()
+        if receipt_data:
+            _clear_pending('pending_receipt', receipt_token)
+        invalidate_net_worth(current_user.id)
 
         return jsonify({
             'success': True,
@@ -474,18 +541,16 @@ def camera_capture(transaction_id):
 @login_required
 def view(receipt_id):
     """View receipt details"""
-    receipt = Receipt.query.get_or_404(receipt_id)
-
-    # Verify user owns this receipt
-    if receipt.transaction.user_id != current_user.id:
-        flash('Access denied', 'danger')
-        return redirect(url_for('receipts.index'))
+    # The page shows the linked transaction and its account
+    receipt = _get_owned_receipt(
+        receipt_id, joinedload(Receipt.transaction).joinedload(Transaction.account)
+    )
 
     # Parse items if available
     items = []
     if receipt.extracted_items:
         try:
-            items = json.loads(receipt.extracted_items)
+            items = orjson.loads(receipt.extracted_items)
         except:
             pass
 
@@ -495,16 +560,16 @@ def view(receipt_id):
 @login_required
 def serve_image(receipt_id):
     """Serve receipt image"""
-    receipt = Receipt.query.get_or_404(receipt_id)
-
-    # Verify user owns this receipt
-    if receipt.transaction.user_id != current_user.id:
-        flash('Access denied', 'danger')
-        return redirect(url_for('receipts.index'))
+    receipt = _get_owned_receipt(receipt_id)
 
     import os
     if os.path.exists(receipt.filepath):
-        return send_file(receipt.filepath)
+        # Receipt files never change once uploaded: let the browser keep them
+        # (privately) and answer If-None-Match / Range requests with 304 / 206
+        response = send_file(receipt.filepath, conditional=True, max_age=RECEIPT_IMAGE_MAX_AGE)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
     else:
         flash('Receipt image not found', 'danger')
         return redirect(url_for('receipts.index'))
@@ -513,14 +578,9 @@ def serve_image(receipt_id):
 @login_required
 def delete(receipt_id):
     """Delete receipt"""
-    receipt = Receipt.query.get_or_404(receipt_id)
+    _get_owned_receipt(receipt_id)
 
-    # Verify user owns this receipt
-    if receipt.transaction.user_id != current_user.id:
-        flash('Access denied', 'danger')
-        return redirect(url_for('receipts.index'))
-
-    agent = ReceiptOCRAgent()
+    agent = get_ocr_agent()
     success, message = agent.delete_receipt(receipt_id)
 
     if success:
@@ -556,32 +616,24 @@ def suggest_categories():
         return jsonify({'error': 'merchants must be a non-empty array'}), 400
 
     try:
+        # Cached mappings and their category names come back in one query;
+        # only uncached merchants go to the LLM
         categorizer = TransactionCategorizer(current_user.id)
-        suggestions = []
+        results = categorizer.categorize_batch(
+            merchant.strip() for merchant in merchants if merchant and merchant.strip()
+        )
 
+        suggestions = []
         for merchant in merchants:
-            if not merchant or not merchant.strip():
-                suggestions.append({
-                    'merchant': merchant,
-                    'category_id': None,
-                    'category_name': None
-                })
-                continue
-
-            # Get category suggestion
-            category_id, is_from_cache, reason = categorizer.categorize_transaction(
-                payee=merchant.strip(),
-                description=None,
-                amount=None
-            )
+            category_id, category_name, is_from_cache = (None, None, False)
+            if merchant and merchant.strip():
+                category_id, category_name, is_from_cache = results[merchant.strip()]
 
             if category_id:
-                # Get category name
-                category = Category.query.get(category_id)
                 suggestions.append({
                     'merchant': merchant,
                     'category_id': category_id,
-                    'category_name': category.name if category else None,
+                    'category_name': category_name,
                     'is_cached': is_from_cache
                 })
             else:
@@ -618,7 +670,7 @@ def api_upload():
     if not transaction or transaction.user_id != current_user.id:
         return jsonify({'error': 'Access denied'}), 403
 
-    agent = ReceiptOCRAgent()
+    agent = get_ocr_agent()
     receipt, parsed_data = agent.process_receipt(file, int(transaction_id))
 
     if not receipt:
@@ -639,14 +691,9 @@ def api_upload():
 @login_required
 def auto_match(receipt_id):
     """Try to auto-match receipt to existing transaction"""
-    receipt = Receipt.query.get_or_404(receipt_id)
+    receipt = _get_owned_receipt(receipt_id)
 
-    # Verify user owns this receipt
-    if receipt.transaction.user_id != current_user.id:
-        flash('Access denied', 'danger')
-        return redirect(url_for('receipts.index'))
-
-    agent = ReceiptOCRAgent()
+    agent = get_ocr_agent()
 
     # Get parsed data
     parsed_data = {
@@ -656,7 +703,7 @@ def auto_match(receipt_id):
     }
 
     # Try to find matching transaction
-    matched_transaction = agent.auto_match_receipt(parsed_data)
+    matched_transaction = agent.auto_match_receipt(parsed_data, current_user.id)
 
     if matched_transaction:
         # Link receipt to matched transaction
@@ -668,5 +715,3 @@ def auto_match(receipt_id):
     else:
         flash('Could not find matching transaction. Please match manually.', 'warning')
         return redirect(url_for('receipts.view', receipt_id=receipt_id))
-
-from datetime import datetime
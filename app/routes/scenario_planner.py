@@ -1,9 +1,10 @@
 """Routes for Scenario Planning & Forecasting"""
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-import json
+from flask_login import current_user, login_required
 from datetime import datetime
 from app import db
 from app.models import Scenario
+from sqlalchemy.orm import load_only
 from app.services.scenario_planner import (
     create_scenario,
     delete_scenario,
@@ -13,18 +14,24 @@ from app.services.scenario_planner import (
 bp = Blueprint('scenario_planner', __name__, url_prefix='/scenario-planner')
 
 @bp.route('/')
+@login_required
 def index():
     """Scenario planner dashboard"""
-    scenarios = Scenario.query.order_by(Scenario.created_at.desc()).all()
+    # The list shows summaries only; skip the parameters/results JSON blobs
+    scenarios = Scenario.query.options(
+        load_only(Scenario.name, Scenario.description, Scenario.scenario_type,
+                  Scenario.duration_months, Scenario.created_at)
+    ).order_by(Scenario.created_at.desc()).all()
 
     # Get historical averages for suggestions
-    historical = get_historical_averages()
+    historical = get_historical_averages(current_user.id)
 
     return render_template('scenario_planner/index.html',
                          scenarios=scenarios,
                          historical=historical)
 
 @bp.route('/new', methods=['GET', 'POST'])
+@login_required
 def new_scenario():
     """Create new scenario"""
     if request.method == 'POST':
@@ -92,7 +99,7 @@ def new_scenario():
             flash(f'Error creating scenario: {str(e)}', 'danger')
 
     # GET request - show form
-    historical = get_historical_averages()
+    historical = get_historical_averages(current_user.id)
 
     return render_template('scenario_planner/new.html',
                          historical=historical)
@@ -102,14 +109,10 @@ def view_scenario(scenario_id):
     """View scenario details and results"""
     scenario = Scenario.query.get_or_404(scenario_id)
 
-    # Parse JSON fields
-    parameters = json.loads(scenario.parameters)
-    results = json.loads(scenario.results)
-
     return render_template('scenario_planner/view.html',
                          scenario=scenario,
-                         parameters=parameters,
-                         results=results)
+                         parameters=scenario.parameters,
+                         results=scenario.results)
 
 @bp.route('/delete/<int:scenario_id>', methods=['POST'])
 def delete(scenario_id):
@@ -122,23 +125,27 @@ def delete(scenario_id):
     return redirect(url_for('scenario_planner.index'))
 
 @bp.route('/api/historical-averages')
+@login_required
 def api_historical_averages():
     """API endpoint for historical averages"""
-    return jsonify(get_historical_averages())
+    return jsonify(get_historical_averages(current_user.id))
 
 @bp.route('/compare')
 def compare_scenarios():
     """Compare multiple scenarios side by side"""
     scenario_ids = request.args.getlist('ids', type=int)
 
+    # One query for all requested scenarios, shown in the order asked for
+    found = {s.id: s for s in Scenario.query.filter(Scenario.id.in_(scenario_ids))} if scenario_ids else {}
+
     scenarios = []
     for scenario_id in scenario_ids:
-        scenario = Scenario.query.get(scenario_id)
+        scenario = found.get(scenario_id)
         if scenario:
             scenarios.append({
                 'scenario': scenario,
-                'parameters': json.loads(scenario.parameters),
-                'results': json.loads(scenario.results)
+                'parameters': scenario.parameters,
+                'results': scenario.results
             })
 
     return render_template('scenario_planner/compare.html',
@@ -1,36 +1,89 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, g
 from flask_login import login_required, current_user
 from app.models import Category, DashboardPreferences
 from app import db
-import json
+from sqlalchemy.orm import load_only, noload
+from app.services.dashboard import get_or_create_dashboard_preferences, invalidate_dashboard_prefs
+from app.services.receipt_ocr import compile_learned_pattern
+import copy
+import orjson
+import os
+import tempfile
 from pathlib import Path
 
 bp = Blueprint('settings', __name__, url_prefix='/settings')
 
 SETTINGS_FILE = Path(__file__).parent.parent.parent / 'data' / 'settings' / 'app_settings.json'
 
+# Pages a user can pick as their landing page
+VALID_DEFAULT_PAGES = frozenset({'dashboard', 'accounts', 'transactions', 'assets',
+                                 'investments', 'receipts', 'feedback'})
+
+# Dashboard panel toggles, submitted as checkboxes
+DASHBOARD_PANEL_FIELDS = ('show_accounts', 'show_transactions', 'show_investments',
+                          'show_assets', 'show_receipts')
+
+# Parsed settings file, reused until the file's mtime changes
+_SETTINGS_CACHE = {'mtime': None, 'data': None}
+
 def load_settings():
     """Load application settings from file"""
-    if SETTINGS_FILE.exists():
-        with open(SETTINGS_FILE, 'r') as f:
-            return json.load(f)
-    return {'currency': current_app.config['DEFAULT_CURRENCY']}
+    try:
+        mtime = SETTINGS_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {'currency': current_app.config['DEFAULT_CURRENCY']}
+    if _SETTINGS_CACHE['mtime'] != mtime:
+        _SETTINGS_CACHE['data'] = orjson.loads(SETTINGS_FILE.read_bytes())
+        _SETTINGS_CACHE['mtime'] = mtime
+    # Callers edit the returned dict before saving it
+    return copy.copy(_SETTINGS_CACHE['data'])
 
 def save_settings(settings):
     """Save application settings to file"""
-    SETTINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=2)
+    # Write a sibling temp file and rename it over the original, so a crash
+    # mid-write never leaves load_settings a truncated file
+    def temp_file():
+        return tempfile.NamedTemporaryFile(dir=SETTINGS_FILE.parent, prefix=f'{SETTINGS_FILE.name}.',
+                                           suffix='.tmp', delete=False)
+    try:
+        f = temp_file()
+    except FileNotFoundError:
+        # Only the very first save needs the directory created
+        SETTINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        f = temp_file()
+    try:
+        with f:
+            f.write(orjson.dumps(settings, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f.name, SETTINGS_FILE)
+    except BaseException:
+        os.unlink(f.name)
+        raise
+    _SETTINGS_CACHE['data'] = copy.copy(settings)
+    _SETTINGS_CACHE['mtime'] = SETTINGS_FILE.stat().st_mtime_ns
+    g.pop('currency_ctx', None)
+
+def get_currency_context():
+    """Return (symbol, code, info) for the current currency
+
+    The settings file is read once per request and the result kept on g, since
+    the currency filter asks for it for every amount rendered.
+    """
+    if 'currency_ctx' not in g:
+        code = load_settings().get('currency', current_app.config['DEFAULT_CURRENCY'])
+        info = current_app.config['CURRENCIES'].get(code, current_app.config['CURRENCIES']['PHP'])
+        g.currency_ctx = (info['symbol'], code, info)
+    return g.currency_ctx
 
 def get_current_currency():
     """Get the currently selected currency code"""
-    settings = load_settings()
-    return settings.get('currency', current_app.config['DEFAULT_CURRENCY'])
+    return get_currency_context()[1]
 
 def get_currency_info(currency_code=None):
     """Get currency information for the current or specified currency"""
     if currency_code is None:
-        currency_code = get_current_currency()
+        return get_currency_context()[2]
     return current_app.config['CURRENCIES'].get(currency_code,
                                                  current_app.config['CURRENCIES']['PHP'])
 
@@ -70,8 +123,10 @@ def update():
     # Update currency
     new_currency = request.form.get('currency')
     if new_currency in current_app.config['CURRENCIES']:
-        settings['currency'] = new_currency
-        save_settings(settings)
+        # The form always posts the currency; only rewrite the file when it changed
+        if settings.get('currency') != new_currency:
+            settings['currency'] = new_currency
+            save_settings(settings)
         flash(f'Currency updated to {current_app.config["CURRENCIES"][new_currency]["name"]}', 'success')
     else:
         flash('Invalid currency selection', 'danger')
@@ -79,12 +134,13 @@ def update():
     # Update default page
     new_default_page = request.form.get('default_page')
     if new_default_page:
-        valid_pages = ['dashboard', 'accounts', 'transactions', 'assets', 'investments', 'receipts', 'feedback']
-        if new_default_page in valid_pages:
-            prefs = DashboardPreferences.query.filter_by(user_id=current_user.id).first()
-            if prefs:
-                prefs.default_page = new_default_page
+        if new_default_page in VALID_DEFAULT_PAGES:
+            # One UPDATE; a zero rowcount means the user has no preferences row
+            updated = DashboardPreferences.query.filter_by(user_id=current_user.id)\
+                .update({'default_page': new_default_page})
+            if updated:
                 db.session.commit()
+                invalidate_dashboard_prefs(current_user.id)
                 flash(f'Default page updated to {new_default_page.capitalize()}', 'success')
             else:
                 flash('User preferences not found', 'danger')
@@ -130,6 +186,14 @@ def account_types():
 
     return render_template('settings/account_types.html', account_types=settings['account_types'])
 
+def _parent_category_choices(exclude_id=None):
+    """The current user's top-level categories, as offered in the parent dropdown"""
+    query = Category.query.options(load_only(Category.id, Category.name, Category.parent_id))\
+        .filter_by(user_id=current_user.id, parent_id=None)
+    if exclude_id is not None:
+        query = query.filter(Category.id != exclude_id)
+    return query.order_by(Category.name).all()
+
 @bp.route('/categories/new', methods=['GET', 'POST'])
 @login_required
 def new_category():
@@ -157,8 +221,7 @@ def new_category():
         flash(f'Category "{name}" created successfully!', 'success')
         return redirect(url_for('settings.index'))
 
-    categories = Category.query.all()
-    return render_template('settings/category_form.html', category=None, categories=categories)
+    return render_template('settings/category_form.html', category=None, categories=_parent_category_choices())
 
 @bp.route('/categories/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -189,22 +252,26 @@ def edit_category(id):
         flash(f'Category "{name}" updated successfully!', 'success')
         return redirect(url_for('settings.index'))
 
-    categories = Category.query.all()
-    return render_template('settings/category_form.html', category=category, categories=categories)
+    return render_template('settings/category_form.html', category=category,
+                           categories=_parent_category_choices(exclude_id=id))
 
 @bp.route('/categories/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_category(id):
     """Delete a category from settings"""
-    category = Category.query.filter_by(id=id, user_id=current_user.id).first_or_404()
-
-    # Check if category has transactions
-    if category.transactions.count() > 0:
+    # Load the category together with EXISTS checks for transactions and
+    # subcategories, instead of a query for each
+    category, has_transactions, has_subcategories = db.session.query(
+        Category, Category.transactions.any(), Category.subcategories.any()
+    ).options(noload(Category.subcategories))\
+        .filter_by(id=id, user_id=current_user.id).first_or_404()
+
+    if has_transactions:
         flash('Cannot delete category that has associated transactions', 'danger')
         return redirect(url_for('settings.index'))
 
     # If category has subcategories, don't allow deletion
-    if category.subcategories:
+    if has_subcategories:
         flash('Cannot delete category that has subcategories', 'danger')
         return redirect(url_for('settings.index'))
 
@@ -219,21 +286,16 @@ def delete_category(id):
 @login_required
 def dashboard_preferences():
     """Manage dashboard display preferences"""
-    prefs = DashboardPreferences.query.filter_by(user_id=current_user.id).first()
-    if not prefs:
-        prefs = DashboardPreferences(user_id=current_user.id)
-        db.session.add(prefs)
-        db.session.commit()
+    prefs = get_or_create_dashboard_preferences(current_user.id)
 
     if request.method == 'POST':
         # Update preferences based on form data
-        prefs.show_accounts = request.form.get('show_accounts') == 'on'
-        prefs.show_transactions = request.form.get('show_transactions') == 'on'
-        prefs.show_investments = request.form.get('show_investments') == 'on'
-        prefs.show_assets = request.form.get('show_assets') == 'on'
-        prefs.show_receipts = request.form.get('show_receipts') == 'on'
+        form = request.form
+        for field in DASHBOARD_PANEL_FIELDS:
+            setattr(prefs, field, form.get(field) == 'on')
 
         db.session.commit()
+        invalidate_dashboard_prefs(current_user.id)
         flash('Dashboard preferences updated successfully!', 'success')
         return redirect(url_for('settings.dashboard_preferences'))
 
@@ -243,8 +305,7 @@ def dashboard_preferences():
 @login_required
 def regex_patterns():
     from app.models import RegexPattern
-    patterns = RegexPattern.query.filter_by(user_id=current_user.id).order_by(RegexPattern.created_at.desc()).all()
-    
+
     if request.method == 'POST':
         action = request.form.get('action')
         
@@ -262,6 +323,10 @@ def regex_patterns():
             if not pattern_str:
                 flash('Regex pattern cannot be empty.', 'danger')
                 return redirect(url_for('settings.regex_patterns'))
+
+            if compile_learned_pattern(pattern_str) is None:
+                flash('Regex pattern is not a valid regular expression.', 'danger')
+                return redirect(url_for('settings.regex_patterns'))
             
             if pattern_id: # Edit existing
                 regex_pattern = RegexPattern.query.get_or_404(pattern_id)
@@ -296,5 +361,7 @@ def regex_patterns():
             db.session.commit()
             flash('Regex pattern deleted successfully!', 'success')
             return redirect(url_for('settings.regex_patterns'))
-            
+
+    # Every POST redirects, so the list is only loaded for rendering
+    patterns = RegexPattern.query.filter_by(user_id=current_user.id).order_by(RegexPattern.created_at.desc()).all()
     return render_template('settings/regex_patterns.html', patterns=patterns)
@@ -1,22 +1,32 @@
 """Routes for Tax Preparation Assistant"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
+from flask_login import current_user, login_required
 from datetime import datetime
+from functools import lru_cache
+from sqlalchemy.orm import joinedload, load_only, selectinload
 from app import db
 from app.models import TaxTag, Transaction
 from app.services.tax_assistant import (
     suggest_tax_deductions,
     add_tax_tag,
     remove_tax_tag,
-    get_tax_summary,
+    get_cached_tax_totals,
+    get_cached_suggestions_count,
+    get_cached_year_end_summary,
     generate_tax_report,
-    get_year_end_summary,
-    export_tax_data_csv,
+    iter_tax_data_csv,
     TAX_DEDUCTION_CATEGORIES
 )
 
 bp = Blueprint('tax_assistant', __name__, url_prefix='/tax-assistant')
 
+@lru_cache(maxsize=2)
+def _available_years(current_year):
+    """The year picker's choices: the current year and the five before it"""
+    return tuple(range(current_year, current_year - 6, -1))
+
 @bp.route('/')
+@login_required
 def index():
     """Tax assistant dashboard"""
     # Get current and previous tax years
@@ -24,20 +34,23 @@ def index():
     selected_year = int(request.args.get('year', current_year))
 
     # Get tax summary
-    summary = get_tax_summary(selected_year)
-
-    # Get recent tags
-    recent_tags = TaxTag.query.filter_by(tax_year=selected_year)\
+    summary = get_cached_tax_totals(current_user.id, selected_year)
+
+    # Get recent tags, with only the columns the table shows; every tag has a
+    # transaction, so it is joined into the same query
+    recent_tags = TaxTag.query.options(
+        load_only(TaxTag.transaction_id, TaxTag.deduction_type, TaxTag.deduction_percentage),
+        joinedload(TaxTag.transaction, innerjoin=True).load_only(Transaction.date, Transaction.payee, Transaction.amount)
+    ).filter_by(tax_year=selected_year)\
         .order_by(TaxTag.created_at.desc())\
         .limit(10)\
         .all()
 
     # Get suggestions count
-    suggestions = suggest_tax_deductions(selected_year)
-    suggestions_count = len(suggestions)
+    suggestions_count = get_cached_suggestions_count(current_user.id, selected_year)
 
     # Available years (current and past 5 years)
-    available_years = list(range(current_year, current_year - 6, -1))
+    available_years = _available_years(current_year)
 
     return render_template('tax_assistant/index.html',
                          summary=summary,
@@ -56,7 +69,7 @@ def suggestions():
     suggestions = suggest_tax_deductions(selected_year)
 
     # Available years
-    available_years = list(range(current_year, current_year - 6, -1))
+    available_years = _available_years(current_year)
 
     return render_template('tax_assistant/suggestions.html',
                          suggestions=suggestions,
@@ -65,6 +78,7 @@ def suggestions():
                          deduction_categories=TAX_DEDUCTION_CATEGORIES)
 
 @bp.route('/tag', methods=['POST'])
+@login_required
 def tag_transaction():
     """Tag a transaction as deductible"""
     transaction_id = request.form.get('transaction_id')
@@ -74,7 +88,7 @@ def tag_transaction():
     notes = request.form.get('notes', '')
 
     try:
-        tag = add_tax_tag(transaction_id, tax_year, deduction_type, deduction_percentage, notes)
+        tag = add_tax_tag(current_user.id, transaction_id, tax_year, deduction_type, deduction_percentage, notes)
         flash(f'Transaction tagged as {deduction_type} deduction.', 'success')
     except Exception as e:
         flash(f'Error tagging transaction: {str(e)}', 'danger')
@@ -83,6 +97,7 @@ def tag_transaction():
     return redirect(request.referrer or url_for('tax_assistant.index'))
 
 @bp.route('/untag/<int:tag_id>', methods=['POST'])
+@login_required
 def untag_transaction(tag_id):
     """Remove tax tag from transaction"""
     if remove_tax_tag(tag_id):
@@ -99,8 +114,11 @@ def tagged_transactions():
     selected_year = int(request.args.get('year', current_year))
     deduction_type = request.args.get('type')
 
-    # Build query
-    query = TaxTag.query.filter_by(tax_year=selected_year)
+    # Build query; the table renders each tag's transaction and its category,
+    # so load both in one IN query each instead of one SELECT per row
+    query = TaxTag.query.options(
+        selectinload(TaxTag.transaction).selectinload(Transaction.category)
+    ).filter_by(tax_year=selected_year)
 
     if deduction_type:
         query = query.filter_by(deduction_type=deduction_type)
@@ -114,7 +132,7 @@ def tagged_transactions():
     )
 
     # Available years
-    available_years = list(range(current_year, current_year - 6, -1))
+    available_years = _available_years(current_year)
 
     return render_template('tax_assistant/tagged_transactions.html',
                          tags=tags,
@@ -125,15 +143,16 @@ def tagged_transactions():
                          selected_type=deduction_type)
 
 @bp.route('/year-end-summary')
+@login_required
 def year_end_summary():
     """Year-end summary report"""
     current_year = datetime.now().year
     selected_year = int(request.args.get('year', current_year - 1))  # Default to last year
 
-    summary = get_year_end_summary(selected_year)
+    summary = get_cached_year_end_summary(current_user.id, selected_year)
 
     # Available years
-    available_years = list(range(current_year, current_year - 6, -1))
+    available_years = _available_years(current_year)
 
     return render_template('tax_assistant/year_end_summary.html',
                          summary=summary,
@@ -143,10 +162,8 @@ def year_end_summary():
 @bp.route('/export/<int:tax_year>')
 def export_csv(tax_year):
     """Export tax deductions to CSV"""
-    csv_content = export_tax_data_csv(tax_year)
-
-    response = make_response(csv_content)
-    response.headers['Content-Type'] = 'text/csv'
+    # Streamed so the first rows go out before the last ones are read
+    response = Response(stream_with_context(iter_tax_data_csv(tax_year)), mimetype='text/csv')
     response.headers['Content-Disposition'] = f'attachment; filename=tax_deductions_{tax_year}.csv'
 
     return response
@@ -162,9 +179,10 @@ def tax_report(tax_year):
                          deduction_categories=TAX_DEDUCTION_CATEGORIES)
 
 @bp.route('/api/summary/<int:tax_year>')
+@login_required
 def api_summary(tax_year):
     """API endpoint for tax summary"""
-    summary = get_tax_summary(tax_year)
+    summary = get_cached_tax_totals(current_user.id, tax_year)
 
     return jsonify({
         'tax_year': summary['tax_year'],
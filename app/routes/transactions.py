@@ -1,8 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import current_user, login_required
-from app.models import Transaction, Account, Category, RegexPattern
+from app.models import Transaction, Account, Category, RegexPattern, Receipt, TaxTag
 from app import db, limiter
-from datetime import datetime
+from app.services.dashboard import invalidate_net_worth
+from app.services.tax_assistant import invalidate_tax_summaries
+from app.utils import parse_ymd
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import joinedload, load_only
 
 def learn_regex_from_payee(payee, user_id, account_type):
     import re
@@ -26,18 +30,47 @@ def learn_regex_from_payee(payee, user_id, account_type):
 
 bp = Blueprint('transactions', __name__, url_prefix='/transactions')
 
+TRANSACTIONS_PER_PAGE = 50
+
+def _tax_years(transaction):
+    """The years whose cached tax summaries a write to this transaction can
+    change: its date's year for the suggestions and its tags' for the totals"""
+    return {transaction.date.year, *(tag.tax_year for tag in transaction.tax_tags)}
+
+def _invalidate_tax_summaries(years):
+    for year in years:
+        invalidate_tax_summaries(current_user.id, year)
+
+def _cursor(transaction):
+    """Page cursor for a listed transaction: its date and id"""
+    return f'{transaction.date.isoformat()}_{transaction.id}'
+
+def _parse_cursor(value):
+    """(date, id) from a page cursor, or None if it is missing or malformed"""
+    try:
+        day, _, transaction_id = value.partition('_')
+        return parse_ymd(day), int(transaction_id)
+    except (AttributeError, ValueError):
+        return None
+
 @bp.route('/')
 @login_required
 def list_transactions():
     """List all transactions with filtering"""
-    page = request.args.get('page', 1, type=int)
+    after = _parse_cursor(request.args.get('after'))
+    before = _parse_cursor(request.args.get('before'))
     account_id = request.args.get('account_id', type=int)
     category_id = request.args.get('category_id', type=int)
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     search = request.args.get('search', '')
 
-    query = Transaction.query.filter_by(user_id=current_user.id)
+    # The table shows each row's account and category; joining them in keeps
+    # rows on inactive accounts (not in the dropdown below) from lazy loading
+    query = Transaction.query.options(
+        joinedload(Transaction.account),
+        joinedload(Transaction.category)
+    ).filter_by(user_id=current_user.id)
 
     # Apply filters
     if account_id:
@@ -45,20 +78,41 @@ def list_transactions():
     if category_id:
         query = query.filter_by(category_id=category_id)
     if start_date:
-        query = query.filter(Transaction.date >= datetime.strptime(start_date, '%Y-%m-%d').date())
+        query = query.filter(Transaction.date >= parse_ymd(start_date))
     if end_date:
-        query = query.filter(Transaction.date <= datetime.strptime(end_date, '%Y-%m-%d').date())
+        query = query.filter(Transaction.date <= parse_ymd(end_date))
     if search:
         query = query.filter(Transaction.payee.ilike(f'%{search}%'))
 
-    transactions = query.order_by(Transaction.date.desc()).paginate(
-        page=page, per_page=50, error_out=False)
+    # Keyset pagination: pages seek past the (date, id) of the row they start
+    # after, so a page deep in the history costs the same as the first one.
+    # One extra row is fetched to tell whether there is a further page.
+    key = tuple_(Transaction.date, Transaction.id)
+    if before:
+        rows = query.filter(key > before)\
+            .order_by(Transaction.date, Transaction.id)\
+            .limit(TRANSACTIONS_PER_PAGE + 1).all()
+        has_newer, has_older = len(rows) > TRANSACTIONS_PER_PAGE, True
+        transactions = rows[:TRANSACTIONS_PER_PAGE][::-1]
+    else:
+        if after:
+            query = query.filter(key < after)
+        rows = query.order_by(Transaction.date.desc(), Transaction.id.desc())\
+            .limit(TRANSACTIONS_PER_PAGE + 1).all()
+        has_newer, has_older = after is not None, len(rows) > TRANSACTIONS_PER_PAGE
+        transactions = rows[:TRANSACTIONS_PER_PAGE]
+
+    # Page links keep the current filters
+    filter_args = {k: v for k, v in request.args.items() if k not in ('after', 'before', 'page')}
 
     accounts = Account.query.filter_by(user_id=current_user.id, is_active=True).all()
     categories = Category.query.filter_by(user_id=current_user.id).all()
 
     return render_template('transactions/list.html',
                          transactions=transactions,
+                         newer_cursor=_cursor(transactions[0]) if has_newer and transactions else None,
+                         older_cursor=_cursor(transactions[-1]) if has_older and transactions else None,
+                         filter_args=filter_args,
                          accounts=accounts,
                          categories=categories)
 
@@ -85,7 +139,7 @@ def new_transaction():
         try:
             transaction = Transaction(
                 user_id=current_user.id,
-                date=datetime.strptime(date_str, '%Y-%m-%d').date(),
+                date=parse_ymd(date_str),
                 amount=amount,
                 payee=payee,
                 memo=memo,
@@ -96,14 +150,16 @@ def new_transaction():
 
             db.session.add(transaction)
 
-            # Update account balance
+            # Update account balance by the new transaction's amount
             account = Account.query.filter_by(id=account_id, user_id=current_user.id).first_or_404()
-            account.update_balance()
+            account.apply_balance_delta(account.balance_effect(transaction_type, amount))
 
             # Learn regex from payee
             learn_regex_from_payee(payee, current_user.id, account.account_type)
 
             db.session.commit()
+            invalidate_net_worth(current_user.id)
+            invalidate_tax_summaries(current_user.id, transaction.date.year)
 
             payee_display = payee if payee else 'Transaction'
             flash(f'{payee_display} added successfully!', 'success')
@@ -130,9 +186,10 @@ def edit_transaction(id):
     transaction = Transaction.query.filter_by(id=id, user_id=current_user.id).first_or_404()
 
     if request.method == 'POST':
+        tax_years = _tax_years(transaction)
         try:
             date_str = request.form.get('date')
-            transaction.date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            transaction.date = parse_ymd(date_str)
             transaction.amount = float(request.form.get('amount'))
             transaction.account_id = int(request.form.get('account_id'))
             category_id = request.form.get('category_id')
@@ -158,6 +215,8 @@ def edit_transaction(id):
         learn_regex_from_payee(transaction.payee, current_user.id, account.account_type)
 
         db.session.commit()
+        invalidate_net_worth(current_user.id)
+        _invalidate_tax_summaries(tax_years | {transaction.date.year})
 
         flash(f'Transaction updated successfully!', 'success')
         return redirect(url_for('transactions.list_transactions'))
@@ -175,13 +234,16 @@ def delete_transaction(id):
     """Delete transaction"""
     transaction = Transaction.query.filter_by(id=id, user_id=current_user.id).first_or_404()
     account = transaction.account
+    tax_years = _tax_years(transaction)
 
     db.session.delete(transaction)
 
-    # Update account balance
-    account.update_balance()
+    # Take the deleted transaction back out of the account balance
+    account.apply_balance_delta(-account.balance_effect(transaction.transaction_type, transaction.amount))
 
     db.session.commit()
+    invalidate_net_worth(current_user.id)
+    _invalidate_tax_summaries(tax_years)
 
     flash('Transaction deleted successfully!', 'success')
     return redirect(url_for('transactions.list_transactions'))
@@ -193,6 +255,7 @@ def toggle_cleared(id):
     transaction = Transaction.query.filter_by(id=id, user_id=current_user.id).first_or_404()
     transaction.is_cleared = not transaction.is_cleared
     db.session.commit()
+    invalidate_net_worth(current_user.id)
 
     return redirect(request.referrer or url_for('transactions.list_transactions'))
 
@@ -205,6 +268,7 @@ def toggle_reconciled(id):
     if transaction.is_reconciled:
         transaction.is_cleared = True  # Reconciled implies cleared
     db.session.commit()
+    invalidate_net_worth(current_user.id)
 
     return redirect(request.referrer or url_for('transactions.list_transactions'))
 
@@ -219,35 +283,50 @@ def bulk_delete():
         if not transaction_ids:
             return jsonify({'error': 'No transactions selected'}), 400
 
-        # Get all transactions to be deleted (only user's own transactions)
-        transactions = Transaction.query.filter(
-            Transaction.id.in_(transaction_ids),
-            Transaction.user_id == current_user.id
-        ).all()
-
-        if not transactions:
-            return jsonify({'error': 'No transactions found'}), 404
+        # Only the user's own transactions are deleted
+        owned = db.and_(Transaction.id.in_(transaction_ids), Transaction.user_id == current_user.id)
 
-        # Collect affected accounts
-        affected_accounts = set()
+        # Amounts totalled per account and type in SQL, rather than loading rows
+        totals = db.session.query(
+            Transaction.account_id, Transaction.transaction_type, func.sum(Transaction.amount)
+        ).filter(owned).group_by(Transaction.account_id, Transaction.transaction_type).all()
 
-        # Delete transactions and track affected accounts
-        for transaction in transactions:
-            affected_accounts.add(transaction.account_id)
-            db.session.delete(transaction)
+        if not totals:
+            return jsonify({'error': 'No transactions found'}), 404
 
-        # Update balances for all affected accounts
-        for account_id in affected_accounts:
-            account = Account.query.get(account_id)
-            if account:
-                account.update_balance()
+        # Sum what each affected account loses
+        accounts = Account.query.options(load_only(Account.account_type))\
+            .filter(Account.id.in_({account_id for account_id, _, _ in totals})).all()
+        accounts = {account.id: account for account in accounts}
+        balance_deltas = {}
+        for account_id, transaction_type, amount in totals:
+            account = accounts[account_id]
+            balance_deltas[account] = balance_deltas.get(account, 0) - \
+                account.balance_effect(transaction_type, amount)
+
+        # A bulk DELETE skips the ORM's receipt cascade, so dependent rows are
+        # removed explicitly; tax tags would otherwise point at nothing
+        owned_ids = db.select(Transaction.id).filter(owned)
+        tax_years = {year for (year,) in db.session.query(TaxTag.tax_year)
+                     .filter(TaxTag.transaction_id.in_(owned_ids)).distinct()}
+        tax_years.update(int(year) for (year,) in db.session.query(func.extract('year', Transaction.date))
+                         .filter(owned).distinct())
+        TaxTag.query.filter(TaxTag.transaction_id.in_(owned_ids)).delete(synchronize_session=False)
+        Receipt.query.filter(Receipt.transaction_id.in_(owned_ids)).delete(synchronize_session=False)
+        deleted_count = Transaction.query.filter(owned).delete(synchronize_session=False)
+
+        # One UPDATE per affected account
+        for account, delta in balance_deltas.items():
+            account.apply_balance_delta(delta)
 
         db.session.commit()
+        invalidate_net_worth(current_user.id)
+        _invalidate_tax_summaries(tax_years)
 
         return jsonify({
             'success': True,
-            'deleted_count': len(transactions),
-            'message': f'Successfully deleted {len(transactions)} transaction(s)'
+            'deleted_count': deleted_count,
+            'message': f'Successfully deleted {deleted_count} transaction(s)'
         })
     except Exception as e:
         db.session.rollback()
@@ -275,7 +354,7 @@ def quick_add_transaction():
 
         # Parse and validate data
         try:
-            transaction_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            transaction_date = parse_ymd(date_str)
             amount_float = float(amount)
         except ValueError:
             return jsonify({'error': 'Invalid date or amount format'}), 400
@@ -306,13 +385,15 @@ def quick_add_transaction():
 
         db.session.add(transaction)
 
-        # Update account balance
-        account.update_balance()
+        # Update account balance by the new transaction's amount
+        account.apply_balance_delta(account.balance_effect(transaction_type, amount_float))
 
         # Learn regex from payee
         learn_regex_from_payee(payee, current_user.id, account.account_type)
 
         db.session.commit()
+        invalidate_net_worth(current_user.id)
+        invalidate_tax_summaries(current_user.id, transaction.date.year)
 
         # Return transaction data for client-side insertion
         return jsonify({
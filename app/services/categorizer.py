@@ -1,11 +1,26 @@
 """Smart transaction categorization service using cache and LLM fallback"""
 import logging
 from app.models import PayeeCategory, Category, Transaction
-from app import db
+from app import db, cache
+from app.utils import dialect_insert
+from datetime import datetime
 import google.generativeai as genai
 
 logger = logging.getLogger(__name__)
 
+# A merchant's cached category is trusted for at most this long, in seconds
+MERCHANT_CATEGORY_CACHE_TIMEOUT = 300
+
+
+def normalize_payee(payee):
+    """The form a payee's mapping is stored under, so spellings that differ
+    only in case or surrounding spaces share one mapping"""
+    return payee.strip().lower()
+
+
+def _merchant_cache_key(user_id, normalized_payee):
+    return f'categorizer:merchant:{user_id}:{normalized_payee}'
+
 
 class TransactionCategorizer:
     """Smart categorization using cache and LLM suggestions"""
@@ -41,11 +56,68 @@ class TransactionCategorizer:
 
         return None, False, "Unable to categorize"
 
-    def _suggest_category_with_llm(self, payee, description=None, amount=None):
+    def categorize_batch(self, payees):
+        """
+        Categorize many payees, resolving known mappings in one cache read and
+        at most one query.
+
+        Returns: {payee: (category_id, category_name, is_from_cache)}
+        Payees are looked up by their normalized form, so spellings of one
+        merchant share a mapping and, when there is none, a single LLM call.
+        The user's categories are loaded once for all of those calls and the
+        new mappings are saved in one upsert.
+        """
+        spellings = {}
+        for payee in set(payees):
+            spellings.setdefault(normalize_payee(payee), []).append(payee)
+        if not spellings:
+            return {}
+
+        keys = {merchant: _merchant_cache_key(self.user_id, merchant) for merchant in spellings}
+        known = {merchant: tuple(value) for merchant, value
+                 in zip(keys, cache.get_many(*keys.values())) if value is not None}
+
+        missing = spellings.keys() - known.keys()
+        if missing:
+            stored = {merchant: (category_id, category_name) for merchant, category_id, category_name in
+                      db.session.query(PayeeCategory.payee, Category.id, Category.name).join(
+                          Category, PayeeCategory.category_id == Category.id
+                      ).filter(
+                          PayeeCategory.user_id == self.user_id,
+                          PayeeCategory.payee.in_(missing)
+                      )}
+            if stored:
+                cache.set_many({keys[merchant]: value for merchant, value in stored.items()},
+                               timeout=MERCHANT_CATEGORY_CACHE_TIMEOUT)
+            known.update(stored)
+
+        results = {}
+        for merchant, (category_id, category_name) in known.items():
+            for payee in spellings[merchant]:
+                results[payee] = (category_id, category_name, True)
+
+        uncached = spellings.keys() - known.keys()
+        categories = Category.query.filter_by(user_id=self.user_id).all() if uncached else []
+        learned = {}
+        for merchant in uncached:
+            suggestion = self._suggest_category_with_llm(spellings[merchant][0], categories=categories)
+            if suggestion and suggestion.get('category_id'):
+                learned[merchant] = (suggestion['category_id'], 1)
+                result = (suggestion['category_id'], suggestion['category_name'], False)
+            else:
+                result = (None, None, False)
+            for payee in spellings[merchant]:
+                results[payee] = result
+
+        self.update_mappings_bulk(learned)
+        return results
+
+    def _suggest_category_with_llm(self, payee, description=None, amount=None, categories=None):
         """Use Gemini to suggest the best category for a transaction"""
         try:
-            # Get available categories for this user
-            categories = Category.query.filter_by(user_id=self.user_id).all()
+            # Get available categories for this user unless the caller already has them
+            if categories is None:
+                categories = Category.query.filter_by(user_id=self.user_id).all()
             category_names = [cat.name for cat in categories]
 
             if not category_names:
@@ -168,6 +240,7 @@ Be strict - only use categories from the provided list."""
                 db.session.add(mapping)
 
             db.session.commit()
+            cache.delete(_merchant_cache_key(self.user_id, normalize_payee(payee)))
             logger.info(f"Updated mapping: {payee} → category_id {category_id}")
             return True
         except Exception as e:
@@ -175,6 +248,45 @@ Be strict - only use categories from the provided list."""
             db.session.rollback()
             return False
 
+    def update_mappings_bulk(self, payee_categories, commit=True):
+        """Upsert many payee → category mappings in a single statement
+
+        payee_categories maps payee → (category_id, times_seen). Existing rows
+        take the new category and have their frequency bumped by times_seen,
+        matching repeated update_mapping calls. With commit=False the upsert runs
+        in a savepoint and is left for the caller's commit; a failure only
+        undoes the savepoint.
+        """
+        if not payee_categories:
+            return True
+        try:
+            stmt = dialect_insert(PayeeCategory).values([
+                {'user_id': self.user_id, 'payee': payee, 'category_id': category_id,
+                 'frequency': times_seen, 'updated_at': datetime.utcnow()}
+                for payee, (category_id, times_seen) in payee_categories.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id', 'payee'],
+                set_={
+                    'category_id': stmt.excluded.category_id,
+                    'frequency': PayeeCategory.frequency + stmt.excluded.frequency,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            with db.session.begin_nested():
+                db.session.execute(stmt)
+            if commit:
+                db.session.commit()
+            cache.delete_many(*(_merchant_cache_key(self.user_id, normalize_payee(payee))
+                                for payee in payee_categories))
+            logger.info(f"Updated {len(payee_categories)} payee mappings")
+            return True
+        except Exception as e:
+            logger.error(f"Error updating mappings: {str(e)}")
+            if commit:
+                db.session.rollback()
+            return False
+
     def get_cache_stats(self):
         """Get statistics about cached payee mappings"""
         total = PayeeCategory.query.filter_by(user_id=self.user_id).count()
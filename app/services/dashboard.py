@@ -1,8 +1,85 @@
-from app import db
-from app.models import Transaction, Category, Account
+from flask import g
+from app import db, cache
+from app.models import Transaction, Category, Account, DashboardPreferences
+from app.utils import dialect_insert
 from sqlalchemy import func
+from sqlalchemy.orm import load_only
 from datetime import datetime, timedelta
 
+# Cache lifetimes in seconds; writes invalidate explicitly, the TTL bounds staleness
+NET_WORTH_CACHE_TIMEOUT = 60
+PREFS_CACHE_TIMEOUT = 300
+
+PREFS_FIELDS = ('show_accounts', 'show_transactions', 'show_investments',
+                'show_assets', 'show_receipts', 'default_page')
+
+
+def _net_worth_cache_key(user_id, include_accounts, include_transactions):
+    return f'dash:networth:{user_id}:{int(bool(include_accounts))}{int(bool(include_transactions))}'
+
+
+def _prefs_cache_key(user_id):
+    return f'dash:prefs:{user_id}'
+
+
+def get_or_create_dashboard_preferences(user_id):
+    """Return a user's DashboardPreferences row, inserting the defaults if missing
+
+    Almost every user already has a row, so it is read first. Only a first
+    visit runs INSERT ... ON CONFLICT DO NOTHING RETURNING, where the unique
+    user_id index stops two concurrent first visits from both inserting; the
+    one that loses the race reads the winner's row.
+    """
+    prefs = DashboardPreferences.query.filter_by(user_id=user_id).first()
+    if prefs is not None:
+        return prefs
+
+    stmt = dialect_insert(DashboardPreferences).values(user_id=user_id)\
+        .on_conflict_do_nothing(index_elements=['user_id'])\
+        .returning(DashboardPreferences)
+    prefs = db.session.scalars(stmt).first()
+    if prefs is None:
+        prefs = DashboardPreferences.query.filter_by(user_id=user_id).first()
+    else:
+        db.session.commit()
+    return prefs
+
+
+def get_dashboard_prefs(user_id):
+    """Read-through cache of a user's dashboard preferences as a plain dict
+
+    Creates the default preferences row on first use. The result is also kept
+    on g, since the context processor asks for it on every template render.
+    """
+    per_request = g.setdefault('dashboard_prefs', {})
+    if user_id in per_request:
+        return per_request[user_id]
+
+    key = _prefs_cache_key(user_id)
+    prefs = cache.get(key)
+    if prefs is None:
+        row = get_or_create_dashboard_preferences(user_id)
+        prefs = {field: getattr(row, field) for field in PREFS_FIELDS}
+        cache.set(key, prefs, timeout=PREFS_CACHE_TIMEOUT)
+    per_request[user_id] = prefs
+    return prefs
+
+
+def invalidate_dashboard_prefs(user_id):
+    """Drop cached dashboard preferences after they change"""
+    cache.delete(_prefs_cache_key(user_id))
+    g.get('dashboard_prefs', {}).pop(user_id, None)
+
+
+def invalidate_net_worth(user_id):
+    """Drop cached dashboard totals after an account or transaction write"""
+    cache.delete_many(*[
+        _net_worth_cache_key(user_id, include_accounts, include_transactions)
+        for include_accounts in (True, False)
+        for include_transactions in (True, False)
+    ])
+
+
 class DashboardService:
     def __init__(self, user_id):
         self.user_id = user_id
@@ -71,14 +148,60 @@ class DashboardService:
             Transaction.date.between(start_date, end_date)
         ).group_by(Category.name).order_by(func.sum(Transaction.amount).desc()).all()
 
-    def get_net_worth_data(self):
-        accounts = Account.query.filter_by(user_id=self.user_id, is_active=True).all()
+    def get_cached_net_worth_data(self, include_accounts=True, include_transactions=True):
+        """Read-through cache around get_net_worth_data
+
+        Rows are stored as plain dicts so they can be pickled into Redis and
+        rendered without a database session.
+        """
+        key = _net_worth_cache_key(self.user_id, include_accounts, include_transactions)
+        data = cache.get(key)
+        if data is None:
+            data = self.get_net_worth_data(include_accounts, include_transactions)
+            data['accounts'] = [
+                {'id': acc.id, 'name': acc.name, 'account_type': acc.account_type,
+                 'current_balance': acc.current_balance}
+                for acc in data['accounts']
+            ]
+            data['recent_transactions'] = [
+                {'payee': t.payee, 'date': t.date, 'amount': t.amount,
+                 'transaction_type': t.transaction_type, 'is_cleared': t.is_cleared,
+                 'is_reconciled': t.is_reconciled}
+                for t in data['recent_transactions']
+            ]
+            cache.set(key, data, timeout=NET_WORTH_CACHE_TIMEOUT)
+        return data
+
+    def get_net_worth_data(self, include_accounts=True, include_transactions=True):
+        """Net worth totals plus the account and transaction rows the dashboard renders
+
+        Rows are only loaded for the panels being shown, and only with the columns
+        the dashboard renders; when the account list is hidden the totals come
+        from a grouped aggregate instead.
+        """
+        if include_accounts:
+            accounts = Account.query.options(
+                load_only(Account.name, Account.account_type, Account.current_balance)
+            ).filter_by(user_id=self.user_id, is_active=True).all()
+            balances = [(acc.account_type, acc.current_balance, abs(acc.current_balance)) for acc in accounts]
+        else:
+            accounts = []
+            balances = db.session.query(
+                Account.account_type,
+                func.coalesce(func.sum(Account.current_balance), 0),
+                func.coalesce(func.sum(func.abs(Account.current_balance)), 0)
+            ).filter_by(user_id=self.user_id, is_active=True).group_by(Account.account_type).all()
 
-        total_assets = sum(acc.current_balance for acc in accounts if acc.account_type in ['checking', 'savings', 'cash'])
-        total_liabilities = sum(abs(acc.current_balance) for acc in accounts if acc.account_type == 'credit_card')
+        total_assets = sum(balance for account_type, balance, _ in balances if account_type in ['checking', 'savings', 'cash'])
+        total_liabilities = sum(abs_balance for account_type, _, abs_balance in balances if account_type == 'credit_card')
         net_worth = total_assets - total_liabilities
 
-        recent_transactions = Transaction.query.filter_by(user_id=self.user_id).order_by(Transaction.date.desc()).limit(10).all()
+        recent_transactions = []
+        if include_transactions:
+            recent_transactions = Transaction.query.options(
+                load_only(Transaction.payee, Transaction.date, Transaction.amount, Transaction.transaction_type,
+                          Transaction.is_cleared, Transaction.is_reconciled)
+            ).filter_by(user_id=self.user_id).order_by(Transaction.date.desc()).limit(10).all()
 
         return {
             'accounts': accounts,
@@ -10,6 +10,9 @@ from collections import defaultdict
 import statistics
 from flask_login import current_user
 
+# Minimum time between automatic insight regenerations for a user
+INSIGHT_REFRESH_INTERVAL = timedelta(minutes=15)
+
 class FinancialAdvisorAgent:
     def __init__(self, user_id=None):
         self.insights = []
@@ -229,8 +232,8 @@ class FinancialAdvisorAgent:
 
     def generate_all_insights(self):
         """Run all analyses and generate insights"""
-        # Clear old insights
-        FinancialInsight.query.filter_by(is_dismissed=False).delete()
+        # Clear this user's old insights
+        FinancialInsight.query.filter_by(user_id=self.user_id, is_dismissed=False).delete()
 
         # Reset insights list
         self.insights = []
@@ -278,6 +281,18 @@ def generate_all_insights(start_date, end_date, user_id=None):
     return agent.insights
 
 
+def insights_are_fresh(user_id):
+    """Check whether insights were generated for the user within INSIGHT_REFRESH_INTERVAL
+
+    Every run stores at least the emergency fund insight, so the newest
+    created_at doubles as the time of the user's last run.
+    """
+    last_run_at = db.session.query(func.max(FinancialInsight.created_at)).filter(
+        FinancialInsight.user_id == user_id
+    ).scalar()
+    return last_run_at is not None and datetime.utcnow() - last_run_at < INSIGHT_REFRESH_INTERVAL
+
+
 def detect_spending_spikes(start_date, end_date):
     """Detect spending spikes in categories"""
     cutoff_date = datetime.now() - timedelta(days=90)
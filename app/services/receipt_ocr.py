@@ -4,22 +4,36 @@ Handles receipt image upload, OCR extraction, and data parsing
 Enhanced with Gemini Vision API for intelligent data extraction
 Supports password-protected PDF credit card statements
 """
+import atexit
+import io
 import os
 import re
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from PIL import Image
 import pytesseract
+from flask import current_app
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import load_only
 from app.models import Receipt, Transaction
 from app import db
+from app.utils import run_blocking, parse_ymd
 import json
 import base64
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Concurrent uploads each run their own Tesseract process; keep each one
+# single-threaded so they don't oversubscribe the cores with OpenMP threads.
+# The Dockerfile sets it for deployments; this covers local runs
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
 # Import PDF libraries
 try:
     import pdfplumber
@@ -28,6 +42,14 @@ try:
 except ImportError:
     PDF_SUPPORT = False
 
+# Prefer the in-process Tesseract API; pytesseract forks a tesseract binary
+# and reloads the language model on every call
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
 # Import Gemini
 try:
     import google.generativeai as genai
@@ -40,11 +62,172 @@ try:
 except ImportError:
     GEMINI_AVAILABLE = False
 
+# Receipts are rescaled to this height before OCR; Tesseract time grows with
+# pixel count and accuracy doesn't improve past ~300px character height.
+# The width floor keeps long screenshots from being shrunk unreadably.
+OCR_TARGET_HEIGHT = 1800
+OCR_MIN_WIDTH = 1200
+
+# Adaptive threshold: a pixel is ink when it is this much darker than its
+# Gaussian-weighted neighbourhood (sigma ~= a 31px block)
+ADAPTIVE_THRESHOLD_OFFSET = 10
+ADAPTIVE_THRESHOLD_RADIUS = 5
+BINARIZE_LUT = [255 if d <= ADAPTIVE_THRESHOLD_OFFSET else 0 for d in range(256)]
+
+# A PDF whose text layer yields more than this many characters is treated as a
+# digital statement and parsed with the regex rules before trying Gemini
+PDF_TEXT_LAYER_MIN_CHARS = 50
+
+# Processes used to extract text from multi-page PDFs. The default of 1 keeps
+# extraction in-process: each gunicorn worker would otherwise start its own pool,
+# and every child re-imports the app, which small instances can't afford.
+PDF_WORKERS = int(os.getenv('PDF_WORKERS') or 1)
+_pdf_pool = None
+
+
+def _get_pdf_pool():
+    """Lazily start the shared PDF pool; spawned so children don't inherit gevent state"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+    return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    """Stop the PDF pool's worker processes, if it was started"""
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(cancel_futures=True)
+        _pdf_pool = None
+
+
+atexit.register(shutdown_pdf_pool)
+
+
+def _as_stream(source):
+    """PIL/pdfplumber/pypdf input for a file path or the raw bytes of an upload"""
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _extract_pdf_pages(pdf_source, password, page_numbers):
+    """Text and table rows for the given pages, in page order"""
+    text_content = []
+    with pdfplumber.open(_as_stream(pdf_source), password=password, pages=page_numbers) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text_content.append(page_text)
+
+            # Also try to extract tables (for credit card statements)
+            tables = page.extract_tables()
+            for table in tables:
+                # Convert table to text
+                for row in table:
+                    if row:
+                        text_content.append(' | '.join([str(cell) if cell else '' for cell in row]))
+    return text_content
+
+
+# Tesseract's API objects aren't thread-safe, so each OCR thread keeps its own
+_tess_local = threading.local()
+
+
+def _image_to_string(image, psm=None):
+    """OCR a PIL image, through tesserocr when installed and pytesseract otherwise
+
+    psm is a Tesseract page segmentation mode; None keeps Tesseract's default.
+    """
+    if not TESSEROCR_AVAILABLE:
+        config = f'--psm {psm}' if psm is not None else ''
+        return pytesseract.image_to_string(image, config=config)
+
+    api = getattr(_tess_local, 'api', None)
+    if api is None:
+        api = _tess_local.api = tesserocr.PyTessBaseAPI(lang='eng', oem=tesserocr.OEM.LSTM_ONLY)
+    api.SetPageSegMode(psm if psm is not None else tesserocr.PSM.AUTO)
+    api.SetImage(image)
+    return api.GetUTF8Text()
+
+
+# Statement line patterns, each capturing (date, description, amount)
+STATEMENT_LINE_PATTERNS = [
+    # Pattern 1: Two dates followed by description and amount (e.g., "09/21/25  09/22/25  MERCHANT NAME  859.52")
+    re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\s+(.+?)\s+([\d,]+\.\d{2})\s*$'),
+    # Pattern 2: Two dates with description and amount - more flexible spacing
+    re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\s+(.+?)\s{2,}([\d,]+\.\d{2})'),
+    # Pattern 3: MM/DD/YY Description Amount (standard format)
+    re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+(.+?)\s+([\d,]+\.\d{2})$'),
+    # Pattern 4: MM/DD Description | Amount
+    re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+(.+?)\s*\|\s*([\d,]+\.\d{2})'),
+    # Pattern 5: Date in YYYY-MM-DD format
+    re.compile(r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})\s+(.+?)\s+([\d,]+\.\d{2})$'),
+    # Pattern 6: Table format with multiple separators
+    re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s*\|\s*(.+?)\s*\|\s*([\d,]+\.\d{2})'),
+    # Pattern 7: Very flexible - any date, text, and amount at end
+    re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+(.+?)\s{2,}([\d,]+\.\d{2})\s*$'),
+    # Pattern 8: Month name format (e.g., "October 25, 2025 MERCHANT NAME 1415.50")
+    re.compile(r'([A-Za-z]+\s+\d{1,2},?\s+\d{4})\s+(.+?)\s+([\d,]+\.\d{2})\s*$'),
+    # Pattern 9: Month name with more flexible spacing
+    re.compile(r'([A-Za-z]+\s+\d{1,2},?\s+\d{4})\s+(.+?)\s{2,}([\d,]+\.\d{2})'),
+]
+
+# Date formats tried, in order, on dates pulled from statement lines
+STATEMENT_DATE_FORMATS = (
+    '%m/%d/%y', '%m/%d/%Y', '%d/%m/%y', '%d/%m/%Y',
+    '%m-%d-%y', '%m-%d-%Y', '%d-%m-%Y', '%Y-%m-%d',
+    '%Y/%m/%d', '%d-%b-%Y', '%d-%b-%y', '%B %d, %Y', '%b %d, %Y'
+)
+# The subset used when dates are read from their own column
+COLUMN_DATE_FORMATS = STATEMENT_DATE_FORMATS[:7]
+
+
+@lru_cache(maxsize=1024)
+def parse_statement_date(date_str, formats=STATEMENT_DATE_FORMATS):
+    """Date from the first of formats that parses date_str, or None
+
+    A statement repeats the same handful of dates, and each miss can cost
+    several failed strptime attempts, so results are memoized.
+    """
+    for fmt in formats:
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+# Description cleanup applied to every matched statement line
+_AMOUNT_RE = re.compile(r'([\d,]+\.\d{2})')
+_DESC_PREFIX_RE = re.compile(r'^(PURCHASE|PAYMENT|DEBIT|CREDIT)\s+', re.IGNORECASE)
+_POST_THEN_DATE_RE = re.compile(r'\bPOST\s*\d{1,2}\s*[/-]\s*\d{1,2}(?:\s*[/-]\s*\d{2,4})?', re.IGNORECASE)
+_DATE_THEN_POST_RE = re.compile(r'\d{1,2}\s*[/-]\s*\d{1,2}(?:\s*[/-]\s*\d{2,4})?\s+POST', re.IGNORECASE)
+_TRAILING_DATE_RE = re.compile(r'\s+\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\s*$')
+_POST_WORD_RE = re.compile(r'\bPOST\b', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=512)
+def compile_learned_pattern(pattern):
+    """Compiled form of a user's learned statement pattern, or None if it is invalid
+
+    Learned patterns are the same strings statement after statement, so the
+    compiled objects are memoized across requests.
+    """
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
+
+
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'pdf', 'webp'})
+
+
 class ReceiptOCRAgent:
     def __init__(self):
         self.upload_folder = Path(__file__).parent.parent.parent / 'data' / 'receipts'
         self.upload_folder.mkdir(parents=True, exist_ok=True)
-        self.allowed_extensions = {'png', 'jpg', 'jpeg', 'pdf', 'webp'}
+        self.allowed_extensions = ALLOWED_EXTENSIONS
         self.max_file_size = 10 * 1024 * 1024  # 10MB
 
     def allowed_file(self, filename):
@@ -54,6 +237,14 @@ class ReceiptOCRAgent:
 
     def validate_file_content(self, file_path):
         """Validate file content using magic bytes (file signatures)"""
+        try:
+            with open(file_path, 'rb') as f:
+                return self.detect_file_type(f.read(32))
+        except Exception as e:
+            return False, None
+
+    def detect_file_type(self, header):
+        """Match the leading bytes of a file against the allowed signatures"""
         import imghdr
 
         # Define magic bytes for allowed file types
@@ -68,40 +259,48 @@ class ReceiptOCRAgent:
             b'RIFF': 'webp'  # WebP starts with RIFF, needs additional check
         }
 
-        try:
-            with open(file_path, 'rb') as f:
-                header = f.read(32)  # Read first 32 bytes
+        header = header[:32]
 
-                # Check PDF
-                if header.startswith(b'%PDF'):
-                    return True, 'pdf'
+        # Check PDF
+        if header.startswith(b'%PDF'):
+            return True, 'pdf'
 
-                # Check PNG
-                if header.startswith(b'\x89PNG\r\n\x1a\n'):
-                    return True, 'png'
+        # Check PNG
+        if header.startswith(b'\x89PNG\r\n\x1a\n'):
+            return True, 'png'
 
-                # Check JPEG
-                if header.startswith(b'\xff\xd8\xff'):
-                    return True, 'jpeg'
+        # Check JPEG
+        if header.startswith(b'\xff\xd8\xff'):
+            return True, 'jpeg'
 
-                # Check WebP (RIFF....WEBP format)
-                if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
-                    return True, 'webp'
+        # Check WebP (RIFF....WEBP format)
+        if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+            return True, 'webp'
 
-                # Use imghdr as fallback for image detection
-                img_type = imghdr.what(file_path)
-                if img_type in ['jpeg', 'png', 'webp']:
-                    return True, img_type
+        # Use imghdr as fallback for image detection
+        img_type = imghdr.what(None, h=header)
+        if img_type in ['jpeg', 'png', 'webp']:
+            return True, img_type
 
-                return False, None
-        except Exception as e:
-            return False, None
+        return False, None
+
+    def save_receipt_file(self, file, transaction_id, raw=None):
+        """Save uploaded receipt file with content validation
 
-    def save_receipt_file(self, file, transaction_id):
-        """Save uploaded receipt file with content validation"""
+        raw is the upload's bytes when the caller has already read them; the
+        content is checked in memory and written to disk once.
+        """
         if not file or not self.allowed_file(file.filename):
             return None, "Invalid file type"
 
+        if raw is None:
+            raw = file.read()
+
+        # Validate file content (magic bytes check)
+        is_valid, detected_type = self.detect_file_type(raw)
+        if not is_valid:
+            return None, "Invalid file content. File does not match allowed types."
+
         # Create transaction-specific subdirectory
         trans_dir = self.upload_folder / str(transaction_id)
         trans_dir.mkdir(exist_ok=True)
@@ -114,17 +313,8 @@ class ReceiptOCRAgent:
 
         filepath = trans_dir / filename
 
-        # Save file temporarily
         try:
-            file.save(str(filepath))
-
-            # Validate file content (magic bytes check)
-            is_valid, detected_type = self.validate_file_content(str(filepath))
-            if not is_valid:
-                # Delete invalid file
-                os.remove(str(filepath))
-                return None, "Invalid file content. File does not match allowed types."
-
+            filepath.write_bytes(raw)
             return str(filepath), filename
         except Exception as e:
             # Clean up on error
@@ -132,41 +322,40 @@ class ReceiptOCRAgent:
                 os.remove(str(filepath))
             return None, str(e)
 
-    def extract_text_from_image(self, image_path):
-        """Extract text from image using OCR with preprocessing"""
+    def extract_text_from_image(self, image_source):
+        """Extract text from image using OCR with preprocessing
+
+        image_source is a file path or the image's raw bytes.
+        """
         import logging
         logger = logging.getLogger(__name__)
 
         try:
             # Open image
-            image = Image.open(image_path)
+            image = Image.open(_as_stream(image_source))
             logger.info(f"Image opened: {image.size}, mode: {image.mode}")
 
-            # Convert to RGB if needed
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-                logger.info(f"Converted image to RGB mode")
-
             # --- Advanced Preprocessing ---
-            from PIL import ImageEnhance, ImageFilter
-
-            # 1. Resize to a larger size for better OCR (e.g., 300 DPI)
-            width, height = image.size
-            new_size = (width * 2, height * 2)
-            image = image.resize(new_size, Image.LANCZOS)
-            logger.info(f"Resized image to {new_size}")
+            from PIL import ImageChops, ImageFilter
 
-            # 2. Convert to grayscale
+            # 1. Convert to grayscale first so the resize below works on one
+            # channel instead of three
             gray_image = image.convert('L')
 
-            # 3. Increase contrast
-            enhancer = ImageEnhance.Contrast(gray_image)
-            enhanced_image = enhancer.enhance(2.0)
+            # 2. Rescale once to a fixed height (keeping aspect ratio); phone
+            # photos shrink, small crops grow
+            width, height = gray_image.size
+            scale = max(OCR_TARGET_HEIGHT / height, OCR_MIN_WIDTH / width)
+            new_size = (round(width * scale), round(height * scale))
+            gray_image = gray_image.resize(new_size, Image.LANCZOS)
+            logger.info(f"Resized image to {new_size}")
 
-            # 4. Binarization (convert to black and white)
-            threshold = 128
-            binary_image = enhanced_image.point(lambda x: 0 if x < threshold else 255, '1')
-            logger.info(f"Applied binarization with threshold {threshold}")
+            # 3. Adaptive binarization: compare each pixel against its local
+            # Gaussian mean so uneven lighting and shadows don't wash out text
+            local_mean = gray_image.filter(ImageFilter.GaussianBlur(ADAPTIVE_THRESHOLD_RADIUS))
+            darkness = ImageChops.subtract(local_mean, gray_image)
+            binary_image = darkness.point(BINARIZE_LUT, '1')
+            logger.info(f"Applied adaptive binarization (offset {ADAPTIVE_THRESHOLD_OFFSET})")
 
             # 5. Noise removal (optional, can sometimes hurt)
             # denoised_image = binary_image.filter(ImageFilter.MedianFilter(size=3))
@@ -174,14 +363,14 @@ class ReceiptOCRAgent:
             # --- OCR Attempts ---
 
             # Config 1: Default OCR on preprocessed image
-            text = pytesseract.image_to_string(binary_image, config='--psm 6')
+            text = _image_to_string(binary_image, psm=6)
             logger.info(f"OCR extracted {len(text)} characters (preprocessed config)")
 
             # If we got very little text, try without preprocessing
             if len(text.strip()) < 20:
                 logger.warning(f"Low text extraction ({len(text)} chars), trying with original image...")
-                original_image = Image.open(image_path)
-                text = pytesseract.image_to_string(original_image)
+                original_image = Image.open(_as_stream(image_source))
+                text = _image_to_string(original_image)
                 logger.info(f"OCR extracted {len(text)} characters (original image)")
 
             logger.info("="*80)
@@ -194,42 +383,43 @@ class ReceiptOCRAgent:
             logger.error(f"OCR error: {str(e)}")
             return None, f"OCR error: {str(e)}"
 
-    def extract_text_from_pdf(self, pdf_path, password=None):
-        """Extract text from PDF with optional password support"""
+    def extract_text_from_pdf(self, pdf_source, password=None):
+        """Extract text from PDF with optional password support
+
+        pdf_source is a file path or the PDF's raw bytes.
+        """
         if not PDF_SUPPORT:
             return None, "PDF support not available. Install pdfplumber and pypdf."
 
         try:
             # First check if PDF is encrypted
-            with open(pdf_path, 'rb') as file:
-                reader = pypdf.PdfReader(file)
+            reader = pypdf.PdfReader(_as_stream(pdf_source))
+            page_count = len(reader.pages)
 
-                if reader.is_encrypted:
-                    if not password:
-                        return None, "PDF_PASSWORD_REQUIRED"
+            if reader.is_encrypted:
+                if not password:
+                    return None, "PDF_PASSWORD_REQUIRED"
 
-                    # Try to decrypt with password
-                    try:
-                        if not reader.decrypt(password):
-                            return None, "Invalid password"
-                    except Exception as e:
-                        return None, f"Password error: {str(e)}"
-
-            # Extract text using pdfplumber (better for tables/statements)
-            text_content = []
-            with pdfplumber.open(pdf_path, password=password) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content.append(page_text)
-
-                    # Also try to extract tables (for credit card statements)
-                    tables = page.extract_tables()
-                    for table in tables:
-                        # Convert table to text
-                        for row in table:
-                            if row:
-                                text_content.append(' | '.join([str(cell) if cell else '' for cell in row]))
+                # Try to decrypt with password
+                try:
+                    if not reader.decrypt(password):
+                        return None, "Invalid password"
+                except Exception as e:
+                    return None, f"Password error: {str(e)}"
+
+            # Extract text using pdfplumber (better for tables/statements).
+            # Multi-page statements are split into contiguous page ranges, one per
+            # worker process, and stitched back together in page order.
+            pages = list(range(1, page_count + 1))
+            workers = min(PDF_WORKERS, page_count)
+            if workers > 1:
+                chunk = -(-page_count // workers)
+                ranges = [pages[i:i + chunk] for i in range(0, page_count, chunk)]
+                results = _get_pdf_pool().map(_extract_pdf_pages, [pdf_source] * len(ranges),
+                                              [password] * len(ranges), ranges)
+                text_content = [line for part in results for line in part]
+            else:
+                text_content = _extract_pdf_pages(pdf_source, password, None)
 
             full_text = '\n'.join(text_content)
             return full_text, None
@@ -300,7 +490,7 @@ CRITICAL RULES:
                     for item in data['line_items']:
                         if item.get('date'):
                             try:
-                                item['date'] = datetime.strptime(item['date'], '%Y-%m-%d').date()
+                                item['date'] = parse_ymd(item['date'])
                             except:
                                 item['date'] = None
 
@@ -387,7 +577,7 @@ CRITICAL RULES:
                     for item in data['line_items']:
                         if item.get('date'):
                             try:
-                                item['date'] = datetime.strptime(item['date'], '%Y-%m-%d').date()
+                                item['date'] = parse_ymd(item['date'])
                             except:
                                 item['date'] = None
 
@@ -437,25 +627,13 @@ CRITICAL RULES:
         transaction_count = min(len(descriptions), len(amounts))
         transactions = []
 
-        # Date formats to try
-        date_formats = [
-            '%m/%d/%y', '%m/%d/%Y', '%d/%m/%y', '%d/%m/%Y',
-            '%m-%d-%y', '%m-%d-%Y', '%d-%m-%Y'
-        ]
 
         for i in range(transaction_count):
             # Get date (use first date if we have fewer dates than transactions)
             date_str = dates[i] if i < len(dates) else (dates[0] if dates else None)
 
             # Parse date
-            parsed_date = None
-            if date_str:
-                for fmt in date_formats:
-                    try:
-                        parsed_date = datetime.strptime(date_str, fmt).date()
-                        break
-                    except:
-                        continue
+            parsed_date = parse_statement_date(date_str, COLUMN_DATE_FORMATS) if date_str else None
 
             # Parse amount
             amount_str = amounts[i].replace(',', '')
@@ -502,31 +680,12 @@ CRITICAL RULES:
         # Get learned patterns from the database
         from app.models import RegexPattern
         learned_patterns = RegexPattern.query.filter_by(user_id=user_id).order_by(RegexPattern.confidence_score.desc()).all()
-        
-        # Common patterns for credit card statements
-        patterns = [
-            # Pattern 1: Two dates followed by description and amount (e.g., "09/21/25  09/22/25  MERCHANT NAME  859.52")
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\s+(.+?)\s+([\d,]+\.\d{2})\s*$',
-            # Pattern 2: Two dates with description and amount - more flexible spacing
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\s+(.+?)\s{2,}([\d,]+\.\d{2})',
-            # Pattern 3: MM/DD/YY Description Amount (standard format)
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+(.+?)\s+([\d,]+\.\d{2})$',
-            # Pattern 4: MM/DD Description | Amount
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+(.+?)\s*\|\s*([\d,]+\.\d{2})',
-            # Pattern 5: Date in YYYY-MM-DD format
-            r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})\s+(.+?)\s+([\d,]+\.\d{2})$',
-            # Pattern 6: Table format with multiple separators
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s*\|\s*(.+?)\s*\|\s*([\d,]+\.\d{2})',
-            # Pattern 7: Very flexible - any date, text, and amount at end
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+(.+?)\s{2,}([\d,]+\.\d{2})\s*$',
-            # Pattern 8: Month name format (e.g., "October 25, 2025 MERCHANT NAME 1415.50")
-            r'([A-Za-z]+\s+\d{1,2},?\s+\d{4})\s+(.+?)\s+([\d,]+\.\d{2})\s*$',
-            # Pattern 9: Month name with more flexible spacing
-            r'([A-Za-z]+\s+\d{1,2},?\s+\d{4})\s+(.+?)\s{2,}([\d,]+\.\d{2})',
-        ]
 
-        for p in learned_patterns:
-            patterns.insert(0, p.pattern)
+        # Learned patterns are compiled once per process, not once per line,
+        # and tried ahead of the built-in ones; patterns saved before validation
+        # existed may not compile and are skipped
+        compiled = (compile_learned_pattern(p.pattern) for p in reversed(learned_patterns))
+        patterns = [c for c in compiled if c is not None] + STATEMENT_LINE_PATTERNS
 
         line_num = 0
         for line in lines:
@@ -539,7 +698,7 @@ CRITICAL RULES:
 
             # Extract statement totals/balances
             if 'TOTAL' in line_upper or 'BALANCE' in line_upper:
-                amount_match = re.search(r'([\d,]+\.\d{2})', line)
+                amount_match = _AMOUNT_RE.search(line)
                 if amount_match:
                     amount = float(amount_match.group(1).replace(',', ''))
                     if 'PREVIOUS' in line_upper:
@@ -560,27 +719,16 @@ CRITICAL RULES:
 
             # Try each pattern
             matched = False
+            stripped = line.strip()
             for idx, pattern in enumerate(patterns):
-                match = re.search(pattern, line.strip())
+                match = pattern.search(stripped)
                 if match:
-                    logger.info(f"✓ Line {line_num} matched pattern {idx+1}: {line.strip()}")
+                    logger.info(f"✓ Line {line_num} matched pattern {idx+1}: {stripped}")
                     matched = True
                     date_str, description, amount_str = match.groups()
 
                     # Parse date
-                    parsed_date = None
-                    date_formats = [
-                        '%m/%d/%y', '%m/%d/%Y', '%d/%m/%y', '%d/%m/%Y',
-                        '%m-%d-%y', '%m-%d-%Y', '%d-%m-%Y', '%Y-%m-%d',
-                        '%Y/%m/%d', '%d-%b-%Y', '%d-%b-%y', '%B %d, %Y', '%b %d, %Y'
-                    ]
-
-                    for fmt in date_formats:
-                        try:
-                            parsed_date = datetime.strptime(date_str, fmt).date()
-                            break
-                        except:
-                            continue
+                    parsed_date = parse_statement_date(date_str)
 
                     # Parse amount (handle negative amounts and credits)
                     try:
@@ -608,19 +756,19 @@ CRITICAL RULES:
                     # Clean description
                     description_clean = description.strip()
                     # Remove common prefixes
-                    description_clean = re.sub(r'^(PURCHASE|PAYMENT|DEBIT|CREDIT)\s+', '', description_clean, flags=re.IGNORECASE)
+                    description_clean = _DESC_PREFIX_RE.sub('', description_clean)
                     # Remove post date patterns - comprehensive cleanup for all variations:
                     # Matches: "POST 12/15", "POST12/15", "POST 12-15", "POST 12/15/23", "POST 12 15", "12/15 POST", etc.
                     # Pattern 1: POST followed by optional spaces, then date
-                    description_clean = re.sub(r'\bPOST\s*\d{1,2}\s*[/-]\s*\d{1,2}(?:\s*[/-]\s*\d{2,4})?', '', description_clean, flags=re.IGNORECASE)
+                    description_clean = _POST_THEN_DATE_RE.sub('', description_clean)
                     # Pattern 2: Date followed by POST
-                    description_clean = re.sub(r'\d{1,2}\s*[/-]\s*\d{1,2}(?:\s*[/-]\s*\d{2,4})?\s+POST', '', description_clean, flags=re.IGNORECASE)
+                    description_clean = _DATE_THEN_POST_RE.sub('', description_clean)
                     # Pattern 3: Trailing dates (MM/DD/YY or MM/DD/YYYY format)
-                    description_clean = re.sub(r'\s+\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\s*$', '', description_clean)
+                    description_clean = _TRAILING_DATE_RE.sub('', description_clean)
                     # Pattern 4: POST alone at end or beginning
-                    description_clean = re.sub(r'\bPOST\b', '', description_clean, flags=re.IGNORECASE)
+                    description_clean = _POST_WORD_RE.sub('', description_clean)
                     # Clean up multiple spaces
-                    description_clean = re.sub(r'\s+', ' ', description_clean)
+                    description_clean = _WHITESPACE_RE.sub(' ', description_clean)
                     description_clean = description_clean.strip()
 
                     if parsed_date and description_clean:
@@ -819,37 +967,62 @@ CRITICAL RULES:
         logger = logging.getLogger(__name__)
         logger.info("--- Starting Receipt Extraction ---")
 
-        # Save file to temporary location
-        filepath, filename_or_error = self.save_receipt_file(file, temp_folder)
-        if not filepath:
-            logger.error(f"Failed to save file: {filename_or_error}")
-            return None, None, filename_or_error, None
-        logger.info(f"File saved to: {filepath}")
+        # Reject by extension before reading the upload
+        if not file or not self.allowed_file(file.filename):
+            return None, None, "Invalid file type", None
 
         file_type = file.content_type or 'image/jpeg'
-        is_pdf = filepath.lower().endswith('.pdf')
+        is_pdf = file.filename.lower().endswith('.pdf')
 
-        # Step 1: Extract text using OCR or PDF parser
+        # The upload is read once; parsing and OCR work on these bytes
+        raw = file.read()
+
+        # Step 1: Extract text using OCR or PDF parser. PDFs are only written to
+        # disk once they have parsed; images are saved first since Gemini Vision
+        # reads them from disk.
         ocr_text = None
         if is_pdf:
             logger.info("PDF file detected, extracting text...")
-            ocr_text, error = self.extract_text_from_pdf(filepath, password)
-        else:
-            logger.info("Image file detected, extracting text with Tesseract...")
-            ocr_text, error = self.extract_text_from_image(filepath)
+            if not raw.startswith(b'%PDF'):
+                return None, None, "Invalid file content. File does not match allowed types.", None
+            ocr_text, error = run_blocking(self.extract_text_from_pdf, raw, password)
+            if error:
+                logger.error(f"Text extraction failed: {error}")
+                return None, None, error, None
 
-        if error:
-            logger.error(f"Text extraction failed: {error}")
-            return None, None, error, None
+        # Save file to temporary location
+        filepath, filename_or_error = self.save_receipt_file(file, temp_folder, raw)
+        if not filepath:
+            logger.error(f"Failed to save file: {filename_or_error}")
+            return None, None, filename_or_error, None
+        logger.info(f"File saved to: {filepath}")
+
+        if not is_pdf:
+            logger.info("Image file detected, extracting text with Tesseract...")
+            ocr_text, error = run_blocking(self.extract_text_from_image, raw)
+            if error:
+                logger.error(f"Text extraction failed: {error}")
+                return None, None, error, None
         if not ocr_text or len(ocr_text.strip()) < 10:
             logger.warning("OCR text is empty or too short.")
             # Even if OCR is weak, we can still try Gemini Vision on the image itself
         else:
             logger.info(f"Successfully extracted {len(ocr_text)} characters of text.")
 
-        # Step 2: Try to parse with Gemini (intelligent structuring)
+        # Step 2: Statement PDFs with a real text layer usually match the regex
+        # rules, so try those before spending a Gemini call
         parsed_data = None
-        if GEMINI_AVAILABLE:
+        regex_data = None
+        if is_pdf and ocr_text and len(ocr_text.strip()) > PDF_TEXT_LAYER_MIN_CHARS:
+            logger.info("PDF has a text layer, trying regex parsing first...")
+            regex_data = self.parse_statement_data(ocr_text, user_id)
+            if regex_data.get('line_items'):
+                parsed_data = regex_data
+                parsed_data['_extraction_method'] = 'pdf_text'
+                logger.info(f"✓ PDF text layer parsed {len(parsed_data['line_items'])} transactions.")
+
+        # Step 3: Try to parse with Gemini (intelligent structuring)
+        if GEMINI_AVAILABLE and not parsed_data:
             if not is_pdf:
                 logger.info("Attempting to parse with Gemini Vision API (image input)...")
                 gemini_data, gemini_error = self.extract_with_gemini(filepath)
@@ -875,13 +1048,16 @@ CRITICAL RULES:
                         logger.warning("✗ Gemini Text returned empty line_items.")
                 else:
                     logger.warning(f"✗ Gemini Text parsing failed: {gemini_error}")
-        else:
+        elif not GEMINI_AVAILABLE:
             logger.info("Gemini is not available. Skipping to regex parsing.")
 
-        # Step 3: Fall back to regex-based parsing if Gemini failed or not available
+        # Step 4: Fall back to regex-based parsing if Gemini failed or not available
         if not parsed_data:
             logger.info("Falling back to regex-based parsing...")
-            if ocr_text:
+            if regex_data is not None:
+                parsed_data = regex_data
+                logger.warning("✗ Regex parsing found no transactions.")
+            elif ocr_text:
                 parsed_data = self.parse_statement_data(ocr_text, user_id)
                 if parsed_data and parsed_data.get('line_items'):
                     parsed_data['_extraction_method'] = 'regex'
@@ -894,7 +1070,7 @@ CRITICAL RULES:
         logger.info("--- Finished Receipt Extraction ---")
         return filepath, filename_or_error, parsed_data, file_type
 
-    def create_receipt_record(self, user_id, filepath, filename, transaction_id, parsed_data, file_type):
+    def create_receipt_record(self, user_id, filepath, filename, transaction_id, parsed_data, file_type, commit=True):
         """Create Receipt database record after transaction is confirmed
 
         Args:
@@ -904,6 +1080,8 @@ CRITICAL RULES:
             transaction_id: Transaction ID to link to
             parsed_data: Extracted data dictionary
             file_type: MIME type of file
+            commit: Commit immediately; pass False to let the caller commit it
+                together with its own writes
 
         Returns:
             Receipt object
@@ -921,7 +1099,8 @@ CRITICAL RULES:
         )
 
         db.session.add(receipt)
-        db.session.commit()
+        if commit:
+            db.session.commit()
 
         return receipt
 
@@ -959,7 +1138,7 @@ CRITICAL RULES:
         if not parsed_data:
             if is_pdf:
                 # Extract text from PDF
-                ocr_text, error = self.extract_text_from_pdf(filepath, password)
+                ocr_text, error = run_blocking(self.extract_text_from_pdf, filepath, password)
                 if error:
                     # Check if password is required
                     if error == "PDF_PASSWORD_REQUIRED":
@@ -967,7 +1146,7 @@ CRITICAL RULES:
                     return None, error
             else:
                 # Perform OCR on image
-                ocr_text, error = self.extract_text_from_image(filepath)
+                ocr_text, error = run_blocking(self.extract_text_from_image, filepath)
                 if error:
                     return None, error
 
@@ -1007,8 +1186,8 @@ CRITICAL RULES:
 
         return receipt, parsed_data
 
-    def auto_match_receipt(self, receipt_data, tolerance_days=3, tolerance_amount=5.0):
-        """Try to automatically match receipt to existing transaction"""
+    def auto_match_receipt(self, receipt_data, user_id, tolerance_days=3, tolerance_amount=5.0):
+        """Try to automatically match receipt to one of the user's existing transactions"""
         if not receipt_data.get('date') or not receipt_data.get('amount'):
             return None
 
@@ -1019,7 +1198,10 @@ CRITICAL RULES:
         date_max = receipt_data['date'] + timedelta(days=tolerance_days)
         amount = receipt_data['amount']
 
-        candidates = Transaction.query.filter(
+        candidates = Transaction.query.options(
+            load_only(Transaction.payee, Transaction.amount)
+        ).filter(
+            Transaction.user_id == user_id,
             Transaction.date >= date_min,
             Transaction.date <= date_max,
             Transaction.amount >= amount - tolerance_amount,
@@ -1029,9 +1211,10 @@ CRITICAL RULES:
         # If merchant name is available, filter by payee match
         if receipt_data.get('merchant') and candidates:
             merchant_lower = receipt_data['merchant'].lower()
-            filtered = [t for t in candidates if merchant_lower in t.payee.lower() or t.payee.lower() in merchant_lower]
-            if filtered:
-                return filtered[0]
+            for t in candidates:
+                payee_lower = (t.payee or '').lower()
+                if payee_lower and (merchant_lower in payee_lower or payee_lower in merchant_lower):
+                    return t
 
         # Return best match (closest amount)
         if candidates:
@@ -1084,10 +1267,13 @@ CRITICAL RULES:
 
     def get_receipt_stats(self, user_id):
         """Get receipt statistics for a specific user"""
-        total_receipts = Receipt.query.filter_by(user_id=user_id).count()
-        receipts_with_amount = Receipt.query.filter_by(user_id=user_id).filter(Receipt.extracted_amount.isnot(None)).count()
-        receipts_with_date = Receipt.query.filter_by(user_id=user_id).filter(Receipt.extracted_date.isnot(None)).count()
-        receipts_with_merchant = Receipt.query.filter_by(user_id=user_id).filter(Receipt.extracted_merchant.isnot(None)).count()
+        # COUNT(column) skips NULLs, so one pass yields every count
+        total_receipts, receipts_with_amount, receipts_with_date, receipts_with_merchant = db.session.query(
+            db.func.count(Receipt.id),
+            db.func.count(Receipt.extracted_amount),
+            db.func.count(Receipt.extracted_date),
+            db.func.count(Receipt.extracted_merchant)
+        ).filter(Receipt.user_id == user_id).one()
 
         return {
             'total': total_receipts,
@@ -1096,3 +1282,11 @@ CRITICAL RULES:
             'with_merchant': receipts_with_merchant,
             'extraction_rate': (receipts_with_amount / total_receipts * 100) if total_receipts > 0 else 0
         }
+
+
+def get_ocr_agent():
+    """The app's shared ReceiptOCRAgent; the agent keeps no per-request state"""
+    agent = current_app.extensions.get('ocr_agent')
+    if agent is None:
+        agent = current_app.extensions['ocr_agent'] = ReceiptOCRAgent()
+    return agent
@@ -3,11 +3,15 @@
 Create financial scenarios, run what-if analyses, and forecast future cash flow.
 """
 from datetime import datetime, timedelta
-from collections import defaultdict
-import json
-from app import db
+from app import db, cache
 from app.models import Scenario, Transaction, Account, Category
 
+# Historical averages are recomputed at most this often, in seconds
+HISTORICAL_AVERAGES_TIMEOUT = 60
+
+def _historical_averages_key(user_id):
+    return f'scenario:historical_averages:{user_id}'
+
 def create_scenario(name, scenario_type, duration_months, parameters, description=None):
     """
     Create a new financial scenario.
@@ -26,13 +30,13 @@ def create_scenario(name, scenario_type, duration_months, parameters, descriptio
         name=name,
         scenario_type=scenario_type,
         duration_months=duration_months,
-        parameters=json.dumps(parameters),
+        parameters=parameters,
         description=description
     )
 
     # Run the scenario calculation
     results = calculate_scenario(scenario_type, duration_months, parameters)
-    scenario.results = json.dumps(results)
+    scenario.results = results
 
     db.session.add(scenario)
     db.session.commit()
@@ -391,29 +395,46 @@ def calculate_what_if(months, parameters):
         'projection': projection
     }
 
-def get_historical_averages():
-    """Get historical income and expense averages for baseline scenarios."""
-    # Get last 3 months of transactions
+def get_historical_averages(user_id):
+    """Get a user's historical income and expense averages for baseline scenarios.
+
+    The totals are aggregated in SQL and the result is cached briefly, since
+    the planner pages and the averages API all ask for it.
+    """
+    key = _historical_averages_key(user_id)
+    averages = cache.get(key)
+    if averages is not None:
+        return averages
+
+    # Last 3 months of transactions
     three_months_ago = datetime.now() - timedelta(days=90)
-    transactions = Transaction.query.filter(Transaction.date >= three_months_ago).all()
+    recent = db.and_(Transaction.user_id == user_id, Transaction.date >= three_months_ago)
 
-    total_income = sum(t.amount for t in transactions if t.amount > 0)
-    total_expenses = abs(sum(t.amount for t in transactions if t.amount < 0))
+    total_income, total_expenses = db.session.query(
+        db.func.coalesce(db.func.sum(db.case((Transaction.amount > 0, Transaction.amount))), 0),
+        db.func.coalesce(db.func.sum(db.case((Transaction.amount < 0, -Transaction.amount))), 0)
+    ).filter(recent).one()
 
     avg_monthly_income = total_income / 3
     avg_monthly_expenses = total_expenses / 3
 
     # Category breakdown
-    category_expenses = defaultdict(float)
-    for t in transactions:
-        if t.amount < 0 and t.category:
-            category_expenses[t.category.name] += abs(t.amount)
+    category_expenses = db.session.query(
+        Category.name, db.func.sum(-Transaction.amount)
+    ).join(Transaction.category).filter(recent, Transaction.amount < 0).group_by(Category.name).all()
 
-    return {
+    averages = {
         'avg_monthly_income': round(avg_monthly_income, 2),
         'avg_monthly_expenses': round(avg_monthly_expenses, 2),
-        'category_breakdown': {k: round(v / 3, 2) for k, v in category_expenses.items()}
+        'category_breakdown': {k: round(v / 3, 2) for k, v in category_expenses}
     }
+    cache.set(key, averages, timeout=HISTORICAL_AVERAGES_TIMEOUT)
+    return averages
+
+
+def invalidate_historical_averages(user_id):
+    """Drop a user's cached averages after their transactions are imported"""
+    cache.delete(_historical_averages_key(user_id))
 
 def delete_scenario(scenario_id):
     """Delete a scenario."""
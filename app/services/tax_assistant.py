@@ -2,11 +2,19 @@
 
 Helps track deductible expenses, generate tax reports, and prepare for tax filing.
 """
+import csv
+import io
 from datetime import datetime
 from collections import defaultdict
-from app import db
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.orm import load_only, selectinload
+from app import db, cache
 from app.models import Transaction, Category, TaxTag, Account
 
+# Cached tax summaries are recomputed at most this often, in seconds; tagging
+# and untagging invalidate them immediately
+TAX_SUMMARY_CACHE_TIMEOUT = 60
+
 # Common tax deduction categories
 TAX_DEDUCTION_CATEGORIES = {
     'business_expense': {
@@ -65,13 +73,17 @@ def suggest_tax_deductions(tax_year=None):
     start_date = datetime(tax_year, 1, 1)
     end_date = datetime(tax_year, 12, 31)
 
-    # Get already tagged transaction IDs
-    tagged_ids = set(tag.transaction_id for tag in TaxTag.query.filter_by(tax_year=tax_year).all())
+    # Skip already tagged transactions in the same query, and load the
+    # categories the keyword match reads in one more
+    tagged_ids = select(TaxTag.transaction_id).where(TaxTag.tax_year == tax_year)
 
-    transactions = Transaction.query.filter(
+    transactions = Transaction.query.options(
+        load_only(Transaction.date, Transaction.payee, Transaction.amount, Transaction.category_id),
+        selectinload(Transaction.category)
+    ).filter(
         Transaction.date >= start_date,
         Transaction.date <= end_date,
-        Transaction.id.not_in(tagged_ids) if tagged_ids else True
+        Transaction.id.not_in(tagged_ids)
     ).all()
 
     suggestions = []
@@ -97,11 +109,42 @@ def suggest_tax_deductions(tax_year=None):
 
     return suggestions
 
-def add_tax_tag(transaction_id, tax_year, deduction_type, deduction_percentage=100, notes=None):
+def count_tax_suggestions(tax_year):
+    """
+    Count the suggestions suggest_tax_deductions() would return, in SQL.
+
+    A transaction is suggested once per deduction type whose keywords it
+    matches. Keywords contain no spaces, so matching each one against the payee
+    or the category name is the same test as matching the "payee category" text.
+    """
+    start_date = datetime(tax_year, 1, 1)
+    end_date = datetime(tax_year, 12, 31)
+
+    payee = func.lower(Transaction.payee)
+    category_name = func.lower(Category.name)
+    matches_per_type = [
+        func.sum(case((or_(*[col.contains(kw, autoescape=True)
+                             for kw in info['keywords'] for col in (payee, category_name)]), 1), else_=0))
+        for info in TAX_DEDUCTION_CATEGORIES.values()
+    ]
+    tagged_ids = select(TaxTag.transaction_id).where(TaxTag.tax_year == tax_year)
+
+    counts = db.session.query(*matches_per_type)\
+        .select_from(Transaction)\
+        .outerjoin(Category, Transaction.category_id == Category.id)\
+        .filter(
+            Transaction.date >= start_date,
+            Transaction.date <= end_date,
+            Transaction.id.not_in(tagged_ids)
+        ).one()
+    return sum(count or 0 for count in counts)
+
+def add_tax_tag(user_id, transaction_id, tax_year, deduction_type, deduction_percentage=100, notes=None):
     """
     Tag a transaction as tax deductible.
 
     Args:
+        user_id: Owner of the transaction
         transaction_id: Transaction ID
         tax_year: Tax year (e.g., 2024)
         deduction_type: Type of deduction
@@ -123,10 +166,12 @@ def add_tax_tag(transaction_id, tax_year, deduction_type, deduction_percentage=1
         existing.deduction_percentage = deduction_percentage
         existing.notes = notes
         db.session.commit()
+        invalidate_tax_summaries(user_id, tax_year)
         return existing
 
     # Create new tag
     tag = TaxTag(
+        user_id=user_id,
         transaction_id=transaction_id,
         tax_year=tax_year,
         deduction_type=deduction_type,
@@ -135,6 +180,7 @@ def add_tax_tag(transaction_id, tax_year, deduction_type, deduction_percentage=1
     )
     db.session.add(tag)
     db.session.commit()
+    invalidate_tax_summaries(user_id, tax_year)
 
     return tag
 
@@ -144,6 +190,7 @@ def remove_tax_tag(tag_id):
     if tag:
         db.session.delete(tag)
         db.session.commit()
+        invalidate_tax_summaries(tag.user_id, tag.tax_year)
         return True
     return False
 
@@ -154,7 +201,7 @@ def get_tax_summary(tax_year):
     Returns:
         dict: Summary with totals by deduction type
     """
-    tags = TaxTag.query.filter_by(tax_year=tax_year).all()
+    tags = TaxTag.query.options(selectinload(TaxTag.transaction)).filter_by(tax_year=tax_year).all()
 
     summary = {
         'tax_year': tax_year,
@@ -294,6 +341,55 @@ def get_year_end_summary(tax_year):
         'accounts_summary': get_accounts_summary()
     }
 
+def _tax_cache_keys(user_id, tax_year):
+    return {
+        'totals': f'tax:totals:{user_id}:{tax_year}',
+        'suggestions_count': f'tax:suggestions_count:{user_id}:{tax_year}',
+        'year_end': f'tax:year_end:{user_id}:{tax_year}',
+    }
+
+def _totals_by_type(by_type):
+    """Drop the per-type transaction lists, keeping the counts and totals"""
+    return {k: {'count': v['count'], 'total': v['total']} for k, v in by_type.items()}
+
+def get_cached_tax_totals(user_id, tax_year):
+    """Read-through cache of get_tax_summary's counts and totals as plain dicts"""
+    key = _tax_cache_keys(user_id, tax_year)['totals']
+    totals = cache.get(key)
+    if totals is None:
+        summary = get_tax_summary(tax_year)
+        totals = {
+            'tax_year': tax_year,
+            'total_deductions': summary['total_deductions'],
+            'total_transactions': summary['total_transactions'],
+            'by_type': _totals_by_type(summary['by_type']),
+        }
+        cache.set(key, totals, timeout=TAX_SUMMARY_CACHE_TIMEOUT)
+    return totals
+
+def get_cached_suggestions_count(user_id, tax_year):
+    """Read-through cache of the number of suggested deductions"""
+    key = _tax_cache_keys(user_id, tax_year)['suggestions_count']
+    count = cache.get(key)
+    if count is None:
+        count = count_tax_suggestions(tax_year)
+        cache.set(key, count, timeout=TAX_SUMMARY_CACHE_TIMEOUT)
+    return count
+
+def get_cached_year_end_summary(user_id, tax_year):
+    """Read-through cache of get_year_end_summary, without ORM objects"""
+    key = _tax_cache_keys(user_id, tax_year)['year_end']
+    summary = cache.get(key)
+    if summary is None:
+        summary = get_year_end_summary(tax_year)
+        summary['deductions_by_type'] = _totals_by_type(summary['deductions_by_type'])
+        cache.set(key, summary, timeout=TAX_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+def invalidate_tax_summaries(user_id, tax_year):
+    """Drop a user's cached tax summaries for a year after its tags or transactions change"""
+    cache.delete_many(*_tax_cache_keys(user_id, tax_year).values())
+
 def get_accounts_summary():
     """Get current balance summary for all accounts."""
     accounts = Account.query.all()
@@ -302,6 +398,48 @@ def get_accounts_summary():
         'by_account': {acc.name: acc.current_balance for acc in accounts}
     }
 
+# Rows fetched from the database and written to the CSV stream per chunk
+CSV_EXPORT_CHUNK_SIZE = 1000
+
+def iter_tax_data_csv(tax_year):
+    """
+    Export tax deductions to CSV format, one chunk of rows at a time.
+
+    Rows come from one joined query and are fetched and written
+    CSV_EXPORT_CHUNK_SIZE at a time, so memory stays flat however many
+    transactions are tagged.
+
+    Yields:
+        str: CSV content
+    """
+    rows = db.session.query(
+        Transaction.date, Transaction.payee, Category.name, Transaction.amount,
+        TaxTag.deduction_type, TaxTag.deduction_percentage, TaxTag.notes
+    ).join(Transaction, TaxTag.transaction_id == Transaction.id)\
+        .outerjoin(Category, Transaction.category_id == Category.id)\
+        .filter(TaxTag.tax_year == tax_year)\
+        .order_by(TaxTag.created_at)\
+        .execution_options(yield_per=CSV_EXPORT_CHUNK_SIZE)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(['Date', 'Payee', 'Category', 'Amount', 'Deduction Type',
+                     'Deduction %', 'Deductible Amount', 'Notes'])
+
+    total_deductions = 0
+    for i, (date, payee, category, amount, deduction_type, percentage, notes) in enumerate(rows, 1):
+        deductible_amount = abs(amount) * (percentage / 100)
+        total_deductions += deductible_amount
+        writer.writerow([date.strftime('%Y-%m-%d'), payee, category or 'Uncategorized', abs(amount),
+                         deduction_type, percentage, deductible_amount, notes or ''])
+        if i % CSV_EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    buffer.write(f"\nTotal Deductions:,,,,,{total_deductions}")
+    yield buffer.getvalue()
+
 def export_tax_data_csv(tax_year):
     """
     Export tax deductions to CSV format.
@@ -309,18 +447,4 @@ def export_tax_data_csv(tax_year):
     Returns:
         str: CSV content
     """
-    report = generate_tax_report(tax_year, format='detailed')
-
-    csv_lines = [
-        'Date,Payee,Category,Amount,Deduction Type,Deduction %,Deductible Amount,Notes'
-    ]
-
-    for t in report.get('transactions', []):
-        csv_lines.append(
-            f"{t['date']},{t['payee']},{t['category']},{t['amount']},"
-            f"{t['deduction_type']},{t['deduction_percentage']},{t['deductible_amount']},{t['notes']}"
-        )
-
-    csv_lines.append(f"\nTotal Deductions:,,,,,{report['total_deductions']}")
-
-    return '\n'.join(csv_lines)
+    return ''.join(iter_tax_data_csv(tax_year))
@@ -0,0 +1,42 @@
+"""Small helpers shared by the route modules"""
+from datetime import date, datetime, time
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+
+# Dialect-specific INSERT constructs that support ON CONFLICT
+_DIALECT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def parse_ymd(value):
+    """Parse a 'YYYY-MM-DD' string into a date.
+
+    date.fromisoformat is implemented in C and avoids the _strptime regex
+    machinery that datetime.strptime goes through on every call.
+    """
+    return date.fromisoformat(value)
+
+
+def parse_ymd_datetime(value):
+    """Parse a 'YYYY-MM-DD' string into a datetime at midnight"""
+    return datetime.combine(parse_ymd(value), time.min)
+
+
+def dialect_insert(model):
+    """INSERT for the session's database dialect, so ON CONFLICT clauses can be used"""
+    return _DIALECT_INSERTS[db.session.get_bind().dialect.name](model)
+
+
+def run_blocking(func, *args, **kwargs):
+    """Run CPU-bound work (image/PDF decoding, OCR) on a native thread
+
+    Under gunicorn's gevent workers this keeps the hub free to serve other
+    requests while func runs. Without gevent monkey-patching (dev server,
+    tests) it is just a direct call.
+    """
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return func(*args, **kwargs)
+    if not monkey.is_module_patched('threading'):
+        return func(*args, **kwargs)
+    return get_hub().threadpool.apply(func, args, kwargs)
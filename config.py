@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+import orjson
 
 basedir = Path(__file__).parent.absolute()
 
@@ -33,10 +34,41 @@ class Config:
         'pool_recycle': 3600,
         'pool_size': 10,
         'max_overflow': 20,
+        # JSON/JSONB columns are encoded and decoded with orjson
+        'json_serializer': lambda obj: orjson.dumps(obj).decode(),
+        'json_deserializer': orjson.loads,
     }
 
+    # Dedicated single-connection pool for /health so liveness probes never
+    # queue behind application queries when the main pool is saturated
+    if SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+        SQLALCHEMY_BINDS = {
+            'health': {
+                'url': SQLALCHEMY_DATABASE_URI,
+                'pool_size': 1,
+                'max_overflow': 0,
+                'pool_timeout': 1,
+                'pool_pre_ping': False,
+                'connect_args': {'application_name': 'health'},
+            }
+        }
+
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Rows per INSERT batch when bulk-importing statement transactions; SQLite
+    # has a much lower bound-parameter ceiling than PostgreSQL
+    BULK_IMPORT_BATCH_SIZE = int(os.environ.get('BULK_IMPORT_BATCH_SIZE') or
+                                 (10000 if SQLALCHEMY_DATABASE_URI.startswith('postgresql') else 500))
+
+    # Cache configuration. Writes invalidate cached entries explicitly, which only
+    # reaches every gunicorn worker and Cloud Run instance through a shared Redis,
+    # so without REDIS_URL caching is disabled rather than kept per process
+    REDIS_URL = os.environ.get('REDIS_URL')
+    CACHE_TYPE = 'RedisCache' if REDIS_URL else 'NullCache'
+    CACHE_NO_NULL_WARNING = True
+    CACHE_REDIS_URL = REDIS_URL
+    CACHE_DEFAULT_TIMEOUT = 60
+
     # Gemini API configuration (matches receipt_ocr.py which uses GOOGLE_API_KEY)
     GEMINI_API_KEY = os.environ.get('GOOGLE_API_KEY') or os.environ.get('GEMINI_API_KEY')
 
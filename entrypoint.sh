@@ -13,4 +13,4 @@ timeout 30 python -m flask db upgrade || {
 }
 
 echo "Starting application..."
-exec gunicorn --bind 0.0.0.0:${PORT:-5000} --workers 2 --threads 8 --worker-class gevent --timeout 120 wsgi:app
+exec gunicorn --bind 0.0.0.0:${PORT:-5000} --workers 2 --worker-class gevent --worker-connections 1000 --timeout 120 wsgi:app
@@ -0,0 +1,31 @@
+"""Unique dashboard_preferences.user_id
+
+Revision ID: 3b7c2d9a41f0
+Revises: e6dc16bff2b7
+Create Date: 2026-10-15 10:12:04.512301
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7c2d9a41f0'
+down_revision = 'e6dc16bff2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the oldest row per user so the unique constraint can be added
+    op.execute(
+        'DELETE FROM dashboard_preferences WHERE id NOT IN '
+        '(SELECT MIN(id) FROM dashboard_preferences GROUP BY user_id)'
+    )
+    with op.batch_alter_table('dashboard_preferences', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_dashboard_preferences_user_id', ['user_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('dashboard_preferences', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_dashboard_preferences_user_id', type_='unique')
@@ -0,0 +1,36 @@
+"""Store scenarios.parameters and results as JSON (JSONB on PostgreSQL)
+
+Revision ID: 4c8e1f2a7b30
+Revises: 9e3f6a1b7d52
+Create Date: 2026-10-15 23:20:41.118730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e1f2a7b30'
+down_revision = '9e3f6a1b7d52'
+branch_labels = None
+depends_on = None
+
+JSON_TYPE = sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
+
+def upgrade():
+    # The columns already hold JSON text, so PostgreSQL can cast in place
+    with op.batch_alter_table('scenarios', schema=None) as batch_op:
+        batch_op.alter_column('parameters', existing_type=sa.Text(), type_=JSON_TYPE,
+                              existing_nullable=False, postgresql_using='parameters::jsonb')
+        batch_op.alter_column('results', existing_type=sa.Text(), type_=JSON_TYPE,
+                              existing_nullable=True, postgresql_using='results::jsonb')
+
+
+def downgrade():
+    with op.batch_alter_table('scenarios', schema=None) as batch_op:
+        batch_op.alter_column('results', existing_type=JSON_TYPE, type_=sa.Text(),
+                              existing_nullable=True, postgresql_using='results::text')
+        batch_op.alter_column('parameters', existing_type=JSON_TYPE, type_=sa.Text(),
+                              existing_nullable=False, postgresql_using='parameters::text')
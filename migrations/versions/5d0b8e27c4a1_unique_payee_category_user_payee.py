@@ -0,0 +1,31 @@
+"""Unique payee_categories (user_id, payee)
+
+Revision ID: 5d0b8e27c4a1
+Revises: a71e0c5d9b46
+Create Date: 2026-10-15 13:02:19.446580
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0b8e27c4a1'
+down_revision = 'a71e0c5d9b46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the oldest mapping per (user_id, payee) so the unique constraint can be added
+    op.execute(
+        'DELETE FROM payee_categories WHERE id NOT IN '
+        '(SELECT MIN(id) FROM payee_categories GROUP BY user_id, payee)'
+    )
+    with op.batch_alter_table('payee_categories', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_payee_category_user_payee', ['user_id', 'payee'])
+
+
+def downgrade():
+    with op.batch_alter_table('payee_categories', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_payee_category_user_payee', type_='unique')
@@ -0,0 +1,26 @@
+"""Index investments on (user_id, category_id)
+
+Revision ID: 8f14a6c0d2e5
+Revises: 3b7c2d9a41f0
+Create Date: 2026-10-15 10:41:37.208815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f14a6c0d2e5'
+down_revision = '3b7c2d9a41f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('investments', schema=None) as batch_op:
+        batch_op.create_index('ix_investment_user_category', ['user_id', 'category_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('investments', schema=None) as batch_op:
+        batch_op.drop_index('ix_investment_user_category')
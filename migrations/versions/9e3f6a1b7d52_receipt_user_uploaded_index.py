@@ -0,0 +1,24 @@
+"""Index receipts on (user_id, uploaded_at DESC)
+
+Revision ID: 9e3f6a1b7d52
+Revises: 5d0b8e27c4a1
+Create Date: 2026-10-15 13:40:08.352194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3f6a1b7d52'
+down_revision = '5d0b8e27c4a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_receipt_user_uploaded', 'receipts', ['user_id', sa.text('uploaded_at DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_receipt_user_uploaded', table_name='receipts')
@@ -0,0 +1,38 @@
+"""Server default for investments.updated_at
+
+Revision ID: a71e0c5d9b46
+Revises: f2a8d41c6b93
+Create Date: 2026-10-15 12:08:44.117350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a71e0c5d9b46'
+down_revision = 'f2a8d41c6b93'
+branch_labels = None
+depends_on = None
+
+
+def _set_updated_at_default(server_default):
+    with op.batch_alter_table('investments', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), server_default=server_default)
+        if op.get_context().dialect.name == 'sqlite':
+            # SQLite batch mode rebuilds the table, and copying rows into a
+            # generated column fails; recreate current_value instead of copying it
+            batch_op.drop_column('current_value')
+            batch_op.add_column(sa.Column(
+                'current_value', sa.Float(),
+                sa.Computed('current_price * quantity', persisted=True),
+                nullable=True
+            ))
+
+
+def upgrade():
+    _set_updated_at_default(sa.func.now())
+
+
+def downgrade():
+    _set_updated_at_default(None)
@@ -0,0 +1,30 @@
+"""Index tax_tags by year and categories on (user_id, name)
+
+Revision ID: b5d2e8c1f047
+Revises: 4c8e1f2a7b30
+Create Date: 2026-10-15 23:41:17.604382
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d2e8c1f047'
+down_revision = '4c8e1f2a7b30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_tax_tag_year_type', 'tax_tags', ['tax_year', 'deduction_type'], unique=False)
+    op.create_index('ix_tax_tag_year_created', 'tax_tags', ['tax_year', sa.text('created_at DESC')], unique=False)
+    op.create_index('ix_tax_tag_transaction_year', 'tax_tags', ['transaction_id', 'tax_year'], unique=False)
+    op.create_index('ix_category_user_name', 'categories', ['user_id', 'name'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_category_user_name', table_name='categories')
+    op.drop_index('ix_tax_tag_transaction_year', table_name='tax_tags')
+    op.drop_index('ix_tax_tag_year_created', table_name='tax_tags')
+    op.drop_index('ix_tax_tag_year_type', table_name='tax_tags')
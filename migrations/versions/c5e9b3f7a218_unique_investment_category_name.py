@@ -0,0 +1,39 @@
+"""Unique investment category name per user
+
+Revision ID: c5e9b3f7a218
+Revises: 8f14a6c0d2e5
+Create Date: 2026-10-15 11:03:52.671920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e9b3f7a218'
+down_revision = '8f14a6c0d2e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Point investments at the oldest category of each (user_id, name) group,
+    # then drop the duplicates so the unique constraint can be added
+    op.execute(
+        'UPDATE investments SET category_id = ('
+        ' SELECT MIN(c2.id) FROM investment_categories c1'
+        ' JOIN investment_categories c2 ON c2.user_id = c1.user_id AND c2.name = c1.name'
+        ' WHERE c1.id = investments.category_id'
+        ') WHERE category_id IS NOT NULL'
+    )
+    op.execute(
+        'DELETE FROM investment_categories WHERE id NOT IN '
+        '(SELECT MIN(id) FROM investment_categories GROUP BY user_id, name)'
+    )
+    with op.batch_alter_table('investment_categories', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_investment_category_user_name', ['user_id', 'name'])
+
+
+def downgrade():
+    with op.batch_alter_table('investment_categories', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_investment_category_user_name', type_='unique')
@@ -0,0 +1,28 @@
+"""Index transactions for the newest-first lists
+
+Revision ID: d3a9f6e2c815
+Revises: b5d2e8c1f047
+Create Date: 2026-10-16 09:27:45.118630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a9f6e2c815'
+down_revision = 'b5d2e8c1f047'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_transaction_user_date', 'transactions', ['user_id', sa.text('date DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_transaction_account_date', 'transactions', ['account_id', sa.text('date DESC')], unique=False)
+    op.create_index('ix_transaction_category_date', 'transactions', ['category_id', sa.text('date DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transaction_category_date', table_name='transactions')
+    op.drop_index('ix_transaction_account_date', table_name='transactions')
+    op.drop_index('ix_transaction_user_date', table_name='transactions')
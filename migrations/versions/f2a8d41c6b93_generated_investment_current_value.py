@@ -0,0 +1,33 @@
+"""Generate investments.current_value from current_price * quantity
+
+Revision ID: f2a8d41c6b93
+Revises: c5e9b3f7a218
+Create Date: 2026-10-15 11:37:15.904236
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8d41c6b93'
+down_revision = 'c5e9b3f7a218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # An existing column cannot be turned into a generated one, so recreate it;
+    # the database fills it in from current_price and quantity
+    op.drop_column('investments', 'current_value')
+    op.add_column('investments', sa.Column(
+        'current_value', sa.Float(),
+        sa.Computed('current_price * quantity', persisted=True),
+        nullable=True
+    ))
+
+
+def downgrade():
+    op.drop_column('investments', 'current_value')
+    op.add_column('investments', sa.Column('current_value', sa.Float(), nullable=True))
+    op.execute('UPDATE investments SET current_value = current_price * quantity')
@@ -19,6 +19,7 @@ class TestConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_ENGINE_OPTIONS = {}
+    CACHE_TYPE = 'NullCache'
 
 @pytest.fixture(scope='function')
 def db_session(app):
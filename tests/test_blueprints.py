@@ -0,0 +1,15 @@
+from app.routes import categories
+
+
+def test_categories_blueprint_registered_once(app):
+    """
+    GIVEN a Flask application
+    WHEN the blueprints are registered
+    THEN the categories blueprint and each of its routes are registered exactly once
+    """
+    assert app.blueprints['categories'] is categories.bp
+
+    endpoints = [rule.endpoint for rule in app.url_map.iter_rules()]
+    for endpoint in ('categories.list_categories', 'categories.new_category',
+                     'categories.edit_category', 'categories.delete_category'):
+        assert endpoints.count(endpoint) == 1
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+import pytest
+from app.models import User, FinancialInsight
+import app.routes.financial_advisor as advisor_routes
+
+
+@pytest.fixture
+def generation_calls(monkeypatch):
+    """Record insight generation runs made by the advisor routes"""
+    calls = []
+    monkeypatch.setattr(advisor_routes, 'generate_all_insights',
+                        lambda start_date, end_date, user_id=None: calls.append((start_date, end_date)))
+    return calls
+
+
+def _user_with_insight(db_session, username, age):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    db_session.add(FinancialInsight(user_id=user.id, insight_type='emergency_fund', title='Emergency fund',
+                                    description='Checked', severity='info',
+                                    created_at=datetime.utcnow() - age))
+    db_session.commit()
+    return user
+
+
+def test_advisor_page_regenerates_only_stale_insights(client, db_session, generation_calls):
+    """
+    GIVEN a user whose insights were generated a minute ago
+    WHEN the advisor page is viewed, then viewed again once the insights are an hour old
+    THEN only the second view regenerates them
+    """
+    user = _user_with_insight(db_session, 'fresh', timedelta(minutes=1))
+    client.post('/auth/login', data={'username': 'fresh', 'password': 'password'}, follow_redirects=True)
+
+    assert client.get('/financial-advisor/').status_code == 200
+    assert generation_calls == []
+
+    insight = FinancialInsight.query.filter_by(user_id=user.id).one()
+    insight.created_at = datetime.utcnow() - timedelta(hours=1)
+    db_session.commit()
+
+    assert client.get('/financial-advisor/').status_code == 200
+    assert len(generation_calls) == 1
+
+
+def test_advisor_page_regenerates_for_requested_range(client, db_session, generation_calls):
+    """
+    GIVEN a user whose insights are still fresh
+    WHEN the advisor page is requested for an explicit date range
+    THEN insights are regenerated for that range
+    """
+    _user_with_insight(db_session, 'ranged', timedelta(minutes=1))
+    client.post('/auth/login', data={'username': 'ranged', 'password': 'password'}, follow_redirects=True)
+
+    response = client.get('/financial-advisor/?start_date=2025-01-01&end_date=2025-03-31')
+
+    assert response.status_code == 200
+    assert generation_calls == [(datetime(2025, 1, 1), datetime(2025, 3, 31))]
@@ -0,0 +1,90 @@
+from sqlalchemy import event
+from app.models import User, Investment, InvestmentCategory
+from app import db as _db
+
+
+def _count_queries(client, url):
+    """Return the number of SQL statements executed while fetching url"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(_db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(_db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_investments_index_has_no_n_plus_one(client, db_session):
+    """
+    GIVEN a logged-in user with investments in several categories
+    WHEN the investments dashboard is rendered
+    THEN the number of queries does not grow with the number of investments
+    """
+    user = User(username='investor', email='investor@example.com')
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+
+    client.post('/auth/login', data={'username': 'investor', 'password': 'password'}, follow_redirects=True)
+
+    def add_investment(index):
+        category = InvestmentCategory(user_id=user.id, name=f'Category {index}')
+        db_session.add(category)
+        db_session.flush()
+        db_session.add(Investment(
+            user_id=user.id,
+            name=f'Investment {index}',
+            investment_type='stock',
+            category_id=category.id,
+            quantity=2,
+            purchase_price=10,
+            current_price=12
+        ))
+        db_session.commit()
+
+    add_investment(0)
+    baseline = _count_queries(client, '/investments/')
+
+    for index in range(1, 6):
+        add_investment(index)
+
+    assert _count_queries(client, '/investments/') == baseline
+
+
+def test_investments_index_paginates_by_cursor(client, db_session):
+    """
+    GIVEN a logged-in user with more investments than fit on one page
+    WHEN the investments dashboard is paged through with the cursor
+    THEN each page is bounded and the totals still cover every holding
+    """
+    from app.routes.investments import INVESTMENTS_PER_PAGE
+
+    user = User(username='pager', email='pager@example.com')
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+
+    client.post('/auth/login', data={'username': 'pager', 'password': 'password'}, follow_redirects=True)
+
+    total = INVESTMENTS_PER_PAGE + 5
+    db_session.add_all([
+        Investment(user_id=user.id, name=f'Holding {index}', investment_type='stock',
+                   quantity=1, purchase_price=10, current_price=10)
+        for index in range(total)
+    ])
+    db_session.commit()
+
+    first_page = client.get('/investments/').get_data(as_text=True)
+    assert first_page.count('<strong>Holding ') == INVESTMENTS_PER_PAGE
+    assert f'<h3>{total}</h3>' in first_page
+
+    last_id = Investment.query.filter_by(user_id=user.id).order_by(Investment.id.desc()).all()[INVESTMENTS_PER_PAGE - 1].id
+    second_page = client.get(f'/investments/?cursor={last_id}').get_data(as_text=True)
+    assert second_page.count('<strong>Holding ') == 5
+    assert f'<h3>{total}</h3>' in second_page
@@ -0,0 +1,143 @@
+from app.models import User, Account, Transaction, Receipt, Category, PayeeCategory
+from app.services import receipt_ocr
+
+
+def test_bulk_import_links_receipt_to_first_imported_transaction(client, db_session):
+    """
+    GIVEN a logged-in user with a checking account
+    WHEN a statement is bulk-imported with receipt metadata
+    THEN the receipt is linked to the first imported transaction
+    """
+    user = User(username='importer', email='importer@example.com')
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+
+    account = Account(user_id=user.id, name='Checking', account_type='checking',
+                      starting_balance=100, current_balance=100)
+    db_session.add(account)
+    db_session.commit()
+
+    client.post('/auth/login', data={'username': 'importer', 'password': 'password'}, follow_redirects=True)
+
+    response = client.post('/receipts/bulk-import', json={
+        'account_id': account.id,
+        'transactions': [
+            {'date': '2025-01-02', 'amount': -10, 'description': 'Grocer'},
+            {'date': '2025-01-03', 'amount': 25, 'description': 'Refund'},
+        ],
+        'receipt_metadata': {'filepath': 'statement.pdf', 'filename': 'statement.pdf',
+                             'file_type': 'application/pdf'}
+    })
+
+    assert response.get_json() == {'success': True, 'imported_count': 2}
+    first = Transaction.query.filter_by(user_id=user.id, payee='Grocer').one()
+    assert Receipt.query.filter_by(user_id=user.id).one().transaction_id == first.id
+    assert Account.query.filter_by(id=account.id).one().current_balance == 115
+
+
+def test_reviewed_statement_is_imported_by_token(client, db_session):
+    """
+    GIVEN a logged-in user who has sent a statement for review
+    WHEN the bulk import is confirmed with the returned token
+    THEN the reviewed transactions are imported, and the token cannot be reused
+    """
+    user = User(username='reviewer', email='reviewer@example.com')
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+
+    account = Account(user_id=user.id, name='Checking', account_type='checking',
+                      starting_balance=100, current_balance=100)
+    db_session.add(account)
+    db_session.commit()
+
+    client.post('/auth/login', data={'username': 'reviewer', 'password': 'password'}, follow_redirects=True)
+
+    review = client.post('/receipts/review-statement', json={
+        'account_id': account.id,
+        'transactions': [
+            {'date': '2025-02-01', 'amount': -40, 'description': 'Hardware Store'},
+        ]
+    }).get_json()
+    assert review['success'] and review['count'] == 1
+
+    response = client.post('/receipts/bulk-import', json={'token': review['token']})
+
+    assert response.get_json() == {'success': True, 'imported_count': 1}
+    assert Transaction.query.filter_by(user_id=user.id, payee='Hardware Store').count() == 1
+    assert client.post('/receipts/bulk-import', json={'token': review['token']}).status_code == 400
+
+
+
+def test_bulk_import_stores_one_mapping_per_normalized_payee(client, db_session):
+    """
+    GIVEN a logged-in user importing the same merchant under different spellings
+    WHEN the categorized statement is bulk-imported
+    THEN one payee mapping is stored under the normalized name, counting every spelling
+    """
+    user = User(username='mapper', email='mapper@example.com')
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+
+    account = Account(user_id=user.id, name='Checking', account_type='checking',
+                      starting_balance=100, current_balance=100)
+    category = Category(user_id=user.id, name='Coffee')
+    db_session.add_all([account, category])
+    db_session.commit()
+
+    client.post('/auth/login', data={'username': 'mapper', 'password': 'password'}, follow_redirects=True)
+
+    response = client.post('/receipts/bulk-import', json={
+        'account_id': account.id,
+        'transactions': [
+            {'date': '2025-03-01', 'amount': -4, 'description': 'Corner Cafe', 'category_id': category.id},
+            {'date': '2025-03-02', 'amount': -5, 'description': ' CORNER CAFE ', 'category_id': category.id},
+        ]
+    })
+
+    assert response.get_json() == {'success': True, 'imported_count': 2}
+    mapping = PayeeCategory.query.filter_by(user_id=user.id).one()
+    assert (mapping.payee, mapping.category_id, mapping.frequency) == ('corner cafe', category.id, 2)
+
+
+def _text_pdf(lines):
+    """A minimal PDF with one page per line of text"""
+    count = len(lines)
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>',
+               '<< /Type /Pages /Kids [%s] /Count %d >>' % (' '.join(f'{3 + 2 * i} 0 R' for i in range(count)), count)]
+    for i, line in enumerate(lines):
+        stream = f'BT /F1 12 Tf 72 700 Td ({line}) Tj ET'
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R '
+                       f'/Resources << /Font << /F1 {3 + 2 * count} 0 R >> >> >>')
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+    objects.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    pdf, offsets = b'%PDF-1.4\n', []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f'{number} 0 obj\n{body}\nendobj\n'.encode()
+    xref = len(pdf)
+    pdf += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    pdf += b''.join(f'{offset:010d} 00000 n \n'.encode() for offset in offsets)
+    pdf += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return pdf
+
+
+def test_multi_page_pdf_text_is_extracted_across_the_pool(monkeypatch):
+    """
+    GIVEN a five-page PDF and a PDF pool of two worker processes
+    WHEN its text is extracted
+    THEN every page's text comes back, in page order
+    """
+    lines = [f'01/0{page}/25 MERCHANT {page} 1{page}.50' for page in range(1, 6)]
+    monkeypatch.setattr(receipt_ocr, 'PDF_WORKERS', 2)
+    try:
+        text, error = receipt_ocr.ReceiptOCRAgent().extract_text_from_pdf(_text_pdf(lines))
+        assert receipt_ocr._pdf_pool is not None
+    finally:
+        receipt_ocr.shutdown_pdf_pool()
+
+    assert error is None
+    assert text.splitlines() == lines
@@ -1,4 +1,13 @@
 """WSGI entry point for production deployment"""
+# Patch the stdlib before anything else imports sockets/threads so the
+# gevent workers can overlap blocking I/O across requests
+from gevent import monkey
+monkey.patch_all()
+
+# Make psycopg2 yield to the gevent hub while waiting on PostgreSQL
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
 from app import create_app
 
 app = create_app()